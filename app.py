@@ -1,73 +1,150 @@
-import pandas as pd
-import time
-from city_loader import load_cities
-from aqi_api import fetch_aqi_history
-from utils import get_aqi_category, safe_value
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from grid import plan_grid_cells, unique_cells, DEFAULT_CELL_SIZE
+from aqi_api import POLLUTANTS
+from batch_writer import CheckpointedWriter, to_output_frame
+from rate_limiter import TokenBucket, DEFAULT_CALLS_PER_MINUTE
+import metrics
+
+# pandas and the modules built on it are imported where they are used,
+# so `python app.py --help` and other short invocations start quickly.
+
+@metrics.timed("city_fetch_seconds")
+def fetch_latest_reading(lat, lon, limiter):
+    """
+    Fetches the latest reading for one location.
+    Returns None if the API returned no data.
+    """
+    from history_store import fetch_history
+
+    # Fetch just 1 day to get latest; only hours newer than the stored watermark hit the API,
+    # and the limiter keeps us within API rate limits
+    df = fetch_history(lat, lon, past_days=1, limiter=limiter)
+
+    if df.empty:
+        metrics.inc("cells_without_data_total")
+        return None
+
+    latest = df.iloc[-1]
+    return {'timestamp': latest.name, **latest.reindex(POLLUTANTS).to_dict()}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch the latest AQI for every city in India_Cities.csv.")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Number of concurrent API requests (default: 8)")
+    parser.add_argument("--rate", type=int, default=DEFAULT_CALLS_PER_MINUTE,
+                        help=f"API calls allowed per minute (default: {DEFAULT_CALLS_PER_MINUTE})")
+    parser.add_argument("--grid-size", type=float, default=DEFAULT_CELL_SIZE,
+                        help=f"Fetch once per grid cell of this many degrees and share the result "
+                             f"with every city in it; 0 fetches each city separately (default: {DEFAULT_CELL_SIZE})")
+    parser.add_argument("--batch-size", type=int, default=200,
+                        help="Records buffered before each flush to disk (default: 200)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run, skipping cities already written")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also write a columnar India_All_Cities_AQI.parquet snapshot (needs pyarrow)")
+    parser.add_argument("--regions", metavar="CSV", default=None,
+                        help="Reference points (region, lat, lon) for the regional summary, e.g. district "
+                             "headquarters (default: built-in state/UT points)")
+    parser.add_argument("--history-array", action="store_true",
+                        help="Also update the memory-mapped history array (see history_array.py)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve live metrics on this port (/metrics for Prometheus, /metrics.json)")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="Run the sampling profiler and write collapsed stacks (flamegraph format) to PATH")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import pandas as pd
+    from city_loader import load_cities
+    from snapshot import csv_to_parquet, SNAPSHOT_CSV, SNAPSHOT_PARQUET
+    from rankings import RunRankings
+    from regions import RegionLookup
 
-def main():
     print("Loading cities...")
     cities_df = load_cities()
-    
+
     if cities_df.empty:
         print("No cities found. Exiting.")
         return
 
-    print(f"Found {len(cities_df)} cities. Fetching AQI data...")
-    
-    results = []
-    
-    for index, row in cities_df.iterrows():
-        city = row['city']
-        lat = row['lat']
-        lon = row['lon']
-        
-        print(f"Fetching data for {city}...", end="\r")
-        
-        # Fetch just 1 day to get latest
-        df = fetch_aqi_history(lat, lon, past_days=1)
-        
-        if not df.empty:
-            latest = df.iloc[-1]
-            pm25 = safe_value(latest.get('pm2_5'))
-            
-            record = {
-                'city': city,
-                'lat': lat,
-                'lon': lon,
-                'timestamp': latest.name,
-                'pm2_5': pm25,
-                'pm10': safe_value(latest.get('pm10')),
-                'no2': safe_value(latest.get('no2')),
-                'o3': safe_value(latest.get('o3')),
-                'so2': safe_value(latest.get('so2')),
-                'co': safe_value(latest.get('co')),
-                'aqi_category': get_aqi_category(pm25)
-            }
-            results.append(record)
-        
-        # Respect API rate limits
-        time.sleep(0.2)
+    output_file = SNAPSHOT_CSV
+    # Rankings and regional aggregates are updated as each batch is written
+    region_lookup = RegionLookup.from_csv(args.regions) if args.regions else None
+    rankings = RunRankings(n=10, column='pm2_5', region_lookup=region_lookup)
+    writer = CheckpointedWriter(output_file, batch_size=args.batch_size, resume=args.resume,
+                                transform=to_output_frame, on_flush=rankings.update)
+    if writer.completed:
+        rankings.seed_from_file(writer.partial_file, writer.completed)
+        done_mask = [writer.is_done(*row) for row in cities_df[['city', 'lat', 'lon']].itertuples(index=False, name=None)]
+        cities_df = cities_df[~pd.Series(done_mask, index=cities_df.index)]
+        print(f"Resuming: {len(writer.completed)} cities already done, {len(cities_df)} remaining.")
+
+    # Plan: cities in the same grid cell share one API call
+    cities_df = plan_grid_cells(cities_df, args.grid_size)
+    cells = unique_cells(cities_df)
+    cell_cities = {cell: group for cell, group in cities_df.groupby(['cell_lat', 'cell_lon'], sort=False)[['city', 'lat', 'lon']]}
+    total = len(cells)
+    print(f"Found {len(cities_df)} cities in {total} grid cells. "
+          f"Fetching AQI data with {args.workers} workers at {args.rate} calls/min...")
+
+    limiter = TokenBucket(args.rate)
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port, views={"/rankings.json": rankings.snapshot})
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics, live rankings on /rankings.json")
+    profiler = metrics.SamplingProfiler().start() if args.profile else None
+
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers))
+    try:
+        with writer:
+            fetched = pool.map(lambda cell: fetch_latest_reading(cell[0], cell[1], limiter), cells)
+            for done, (cell, reading) in enumerate(zip(cells, fetched), start=1):
+                print(f"[{done}/{total}] Fetched grid cell {cell[0]:.2f}, {cell[1]:.2f}...", end="\r")
+                if reading is None:
+                    continue
+                # Fan the cell's reading back out to its cities
+                for city, lat, lon in cell_cities[cell].itertuples(index=False, name=None):
+                    writer.write({'city': city, 'lat': lat, 'lon': lon, **reading})
+    finally:
+        # On Ctrl-C or an error, drop queued cells instead of fetching them all before exiting
+        pool.shutdown(wait=True, cancel_futures=True)
+        if profiler is not None:
+            profiler.stop().write_collapsed(args.profile)
 
     print("\nData fetching complete.")
-    
-    if not results:
+    print("\n--- Where the time went ---")
+    print(metrics.summary())
+    if profiler is not None:
+        print(f"\nProfile ({profiler.samples} samples) saved to {args.profile}; hottest functions:")
+        for name, share in profiler.top_functions(10):
+            print(f"  {share:6.1%}  {name}")
+
+    if writer.written == 0 and not writer.completed:
         print("No data fetched.")
         return
 
-    results_df = pd.DataFrame(results)
-    
-    output_file = "India_All_Cities_AQI.csv"
-    results_df.to_csv(output_file, index=False)
     print(f"Results saved to {output_file}")
-    
-    # Analysis
+
+    if args.parquet:
+        print(f"Columnar snapshot saved to {csv_to_parquet(output_file, SNAPSHOT_PARQUET)}")
+
+    if args.history_array:
+        from history_array import sync
+        array = sync()
+        print(f"History array updated: {len(array.locations)} locations x {array.hours} hours in {array.path}")
+
+    # Analysis, from the rankings kept during the run
+    columns = ['city', 'pm2_5', 'aqi_category']
     print("\n--- Top 10 Most Polluted Cities (by PM2.5) ---")
-    top_polluted = results_df.sort_values(by='pm2_5', ascending=False).head(10)
-    print(top_polluted[['city', 'pm2_5', 'aqi_category']].to_string(index=False))
-    
+    print(pd.DataFrame(rankings.leaderboard.top(), columns=columns).to_string(index=False))
+
     print("\n--- Top 10 Cleanest Cities (by PM2.5) ---")
-    top_cleanest = results_df.sort_values(by='pm2_5', ascending=True).head(10)
-    print(top_cleanest[['city', 'pm2_5', 'aqi_category']].to_string(index=False))
+    print(pd.DataFrame(rankings.leaderboard.bottom(), columns=columns).to_string(index=False))
+
+    print("\n--- Regions by Mean AQI ---")
+    print(rankings.regions.table().round(1).to_string(index=False))
 
 if __name__ == "__main__":
     main()
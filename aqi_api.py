@@ -1,47 +1,159 @@
+import operator
 import os
-import requests
-import pandas as pd
+import time
 from datetime import datetime
+import metrics
+import transport
+from cache import get_default_cache, make_key
 
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+# pandas/numpy are imported inside the functions that need them so that importing this
+# module (and running `--help` on the CLIs) stays cheap. Configuration is read at call time.
 
-if not OPENWEATHER_API_KEY:
-    raise RuntimeError("OPENWEATHER_API_KEY not set")
+DEFAULT_BASE_URL = "https://api.openweathermap.org"
+POLLUTANTS = ["pm2_5", "pm10", "no2", "o3", "so2", "co"]
+# Concentrations are reported with two decimals; parsed frames are float32, so round
+# to this when persisting to keep float32 noise (75.77999877929688) out of files
+API_DECIMALS = 2
+_pollutant_getter = operator.itemgetter(*POLLUTANTS)
 
 
-def fetch_aqi_history(lat, lon, past_days=5):
+def get_api_key():
     """
-    Fetch real hourly air pollution data (geo-based)
-    Free tier supports up to 5 days
+    Returns the OpenWeather API key, raising if it is not configured.
     """
-    end = int(datetime.utcnow().timestamp())
-    start = end - past_days * 24 * 3600
+    key = os.getenv("OPENWEATHER_API_KEY")
+    if not key:
+        raise RuntimeError("OPENWEATHER_API_KEY not set")
+    return key
 
-    url = (
-        "https://api.openweathermap.org/data/2.5/air_pollution/history"
-        f"?lat={lat}&lon={lon}&start={start}&end={end}&appid={OPENWEATHER_API_KEY}"
-    )
 
-    res = requests.get(url, timeout=10).json()
+def get_history_url():
+    # Overridable so benchmarks can point at a local stand-in (see mock_server.py)
+    base_url = os.getenv("OPENWEATHER_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+    return f"{base_url}/data/2.5/air_pollution/history"
+
 
-    if "list" not in res:
+def _request_history(lat, lon, start, end, limiter=None, use_cache=True):
+    """
+    Calls the air pollution history endpoint for [start, end] (unix seconds).
+    Responses are cached on disk per rounded location, window start and hour (see cache.py);
+    the rate limiter is only consulted when the request goes to the network.
+    Transient failures are retried by the transport; anything still failing returns {}.
+    """
+    cache = get_default_cache() if use_cache else None
+    key = make_key(lat, lon, start, end)
+    if cache is not None:
+        res = cache.get(key)
+        if res is not None:
+            metrics.inc("cache_hits_total")
+            return res
+        metrics.inc("cache_misses_total")
+
+    params = {"lat": lat, "lon": lon, "start": start, "end": end, "appid": get_api_key()}
+    try:
+        response = transport.request("GET", get_history_url(), params=params, timeout=10, limiter=limiter)
+        with metrics.timer("json_decode_seconds"):
+            res = response.json()
+    except (transport.TransportError, ValueError):
+        metrics.inc("fetch_failures_total")
+        return {}
+    if not res.get("list"):
+        metrics.inc("empty_results_total")
+    # Only cache real data, never error payloads
+    if cache is not None and "list" in res:
+        cache.set(key, res)
+    return res
+
+
+def _frame_from_items(items):
+    """
+    Bulk-converts API list items into float32 pollutant columns and a DatetimeIndex.
+    """
+    import numpy as np
+    import pandas as pd
+
+    components = [item["components"] for item in items]
+    try:
+        # Fast path: every item carries all pollutants (None becomes NaN)
+        values = np.array([_pollutant_getter(c) for c in components], dtype="float32")
+        df = pd.DataFrame(values, columns=POLLUTANTS)
+    except KeyError:
+        df = pd.DataFrame.from_records(components, columns=POLLUTANTS).astype("float32")
+    timestamps = np.fromiter((item["dt"] for item in items), dtype="int64", count=len(items))
+    df.index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit="s"), name="timestamp")
+    return df
+
+
+def parse_history(res):
+    """
+    Converts an API response into a DataFrame of raw readings indexed by timestamp.
+    """
+    import pandas as pd
+
+    items = res.get("list")
+    if not items:
         return pd.DataFrame()
 
-    rows = []
-    for item in res["list"]:
-        c = item["components"]
-        rows.append({
-            "timestamp": datetime.utcfromtimestamp(item["dt"]),
-            "pm2_5": c.get("pm2_5"),
-            "pm10": c.get("pm10"),
-            "no2": c.get("no2"),
-            "o3": c.get("o3"),
-            "so2": c.get("so2"),
-            "co": c.get("co"),
-        })
-
-    df = pd.DataFrame(rows)
-    df = df.set_index("timestamp").sort_index()
-    # Normalize to hourly data so charts change with range selection
-    df = df.resample("1H").mean().interpolate()
+    with metrics.timer("parse_seconds"):
+        df = _frame_from_items(items)
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
     return df
+
+
+def parse_history_batch(responses):
+    """
+    Parses many responses into one long-format frame with a `location` column.
+    `responses` is an iterable of (location, response) pairs; error payloads are skipped.
+    """
+    import pandas as pd
+
+    locations, items = [], []
+    for location, res in responses:
+        batch = res.get("list") or []
+        locations.extend([location] * len(batch))
+        items.extend(batch)
+
+    if not items:
+        return pd.DataFrame(columns=["location", "timestamp"] + POLLUTANTS)
+
+    df = _frame_from_items(items).reset_index()
+    df.insert(0, "location", locations)
+    return df.sort_values(["location", "timestamp"], kind="stable").reset_index(drop=True)
+
+
+def normalize_hourly(df):
+    """
+    Normalize to hourly data so charts change with range selection.
+    Already-regular hourly series are returned as-is; resampling and interpolation only run on gaps.
+    """
+    import pandas as pd
+
+    if df.empty:
+        return df
+    start = time.perf_counter()
+    index = df.index
+    regular = (
+        index.is_monotonic_increasing
+        and index.is_unique
+        and (len(index) < 2 or (index[-1] - index[0]) == pd.Timedelta(hours=len(index) - 1))
+        and (index.floor("h") == index).all()
+    )
+    if not regular:
+        df = df.resample("1h").mean()
+    if df.isna().to_numpy().any():
+        df = df.interpolate()
+    metrics.observe("normalize_seconds", time.perf_counter() - start)
+    return df
+
+
+def fetch_aqi_history(lat, lon, past_days=5, limiter=None):
+    """
+    Fetch real hourly air pollution data (geo-based)
+    Free tier supports up to 5 days
+    The window starts on an hour boundary, so repeat calls within the hour hit the response cache
+    """
+    end = int(datetime.utcnow().timestamp())
+    start = (end // 3600 - past_days * 24) * 3600
+
+    return normalize_hourly(parse_history(_request_history(lat, lon, start, end, limiter=limiter)))
@@ -0,0 +1,135 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from aqi_api import _request_history
+from grid import plan_grid_cells, unique_cells, DEFAULT_CELL_SIZE
+from rate_limiter import TokenBucket, DEFAULT_CALLS_PER_MINUTE
+
+# Largest window the provider serves per request on the free tier
+CHUNK_DAYS = 5
+
+
+def split_range(start, end, chunk_days=CHUNK_DAYS):
+    """
+    Splits [start, end] (unix seconds) into consecutive provider-sized windows.
+    """
+    step = chunk_days * 24 * 3600
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + step)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+def stitch(frames):
+    """
+    Joins chunk results into one sorted hourly series, keeping the last value for any hour
+    that appears in two adjacent chunks.
+    """
+    import pandas as pd
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames).sort_index()
+    return df[~df.index.duplicated(keep="last")]
+
+
+def backfill(locations, days, chunk_days=CHUNK_DAYS, workers=8, rate=DEFAULT_CALLS_PER_MINUTE, store=None, progress=True):
+    """
+    Fetches `days` of history for each fetch point concurrently, in provider-sized chunks under
+    the rate limit, and merges the stitched series into the history store. The one-off chunk
+    windows bypass the response cache so they do not evict entries the refreshes reuse.
+    `locations` maps a fetch point (lat, lon) to the list of (lat, lon) locations it serves.
+    Returns (hourly rows stored per fetch point, number of chunks that returned no data).
+    """
+    from aqi_api import parse_history
+    from history_store import get_default_store
+
+    store = store if store is not None else get_default_store()
+    end = int(time.time())
+    chunks = split_range(end - days * 24 * 3600, end, chunk_days)
+    limiter = TokenBucket(rate)
+
+    pending = {point: len(chunks) for point in locations}
+    frames = {point: [] for point in locations}
+    stored = {}
+    failed = 0
+    total = len(locations) * len(chunks)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(_request_history, lat, lon, start, stop, limiter, False): (lat, lon)
+            for lat, lon in locations
+            for start, stop in chunks
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            point = futures[future]
+            res = future.result()
+            if "list" not in res:
+                failed += 1
+            frames[point].append(parse_history(res))
+            pending[point] -= 1
+            if progress:
+                print(f"[{done}/{total}] chunks fetched...", end="\r")
+            if pending[point]:
+                continue
+
+            # All chunks for this point are in: stitch, store, and free the memory
+            series = stitch(frames.pop(point))
+            if not series.empty:
+                for lat, lon in locations[point]:
+                    store.merge(lat, lon, series)
+            stored[point] = len(series)
+
+    if progress:
+        print()
+    return stored, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill long-range hourly history into the local history store.")
+    parser.add_argument("--days", type=int, default=30, help="Days of history to fetch (default: 30)")
+    parser.add_argument("--city", action="append", help="Only backfill this city (repeatable); default is all cities")
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS,
+                        help=f"Days per API request (default: {CHUNK_DAYS})")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent API requests (default: 8)")
+    parser.add_argument("--rate", type=int, default=DEFAULT_CALLS_PER_MINUTE,
+                        help=f"API calls allowed per minute (default: {DEFAULT_CALLS_PER_MINUTE})")
+    parser.add_argument("--grid-size", type=float, default=DEFAULT_CELL_SIZE,
+                        help=f"Fetch once per grid cell of this many degrees (default: {DEFAULT_CELL_SIZE}; 0 disables)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from city_loader import load_cities, get_city_index
+
+    cities_df = load_cities()
+    if args.city:
+        index = get_city_index()
+        positions = [p for name in args.city for p in (index.lookup(name) if index else [])]
+        cities_df = cities_df.iloc[positions] if positions else cities_df.iloc[0:0]
+    if cities_df.empty:
+        print("No matching cities. Exiting.")
+        return
+
+    planned = plan_grid_cells(cities_df, args.grid_size)
+    locations = {cell: [] for cell in unique_cells(planned)}
+    for lat, lon, cell_lat, cell_lon in planned[['lat', 'lon', 'cell_lat', 'cell_lon']].itertuples(index=False, name=None):
+        locations[(cell_lat, cell_lon)].append((lat, lon))
+
+    calls = len(locations) * len(split_range(0, args.days * 24 * 3600, args.chunk_days))
+    print(f"Backfilling {args.days} days for {len(cities_df)} cities ({len(locations)} grid cells, "
+          f"{calls} API calls at {args.rate} calls/min)...")
+
+    stored, failed = backfill(locations, args.days, args.chunk_days, args.workers, args.rate)
+    print(f"Stored {sum(stored.values())} hourly readings for {len(stored)} grid cells "
+          f"({failed} of {calls} chunk requests returned no data).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+from aqi_api import API_DECIMALS, POLLUTANTS
+
+
+def record_key(city, lat, lon):
+    """
+    Identifies a city in the checkpoint file (names alone are not unique).
+    """
+    return f"{city}|{lat}|{lon}"
+
+
+def to_output_frame(batch_df):
+    """
+    Adds overall CPCB AQI and category to a batch of records in one vectorized pass.
+    Pollutants are rounded to the API's precision for writing.
+    """
+    from utils import add_aqi_columns
+
+    out = add_aqi_columns(batch_df).drop(columns=['dominant_pollutant'])
+    out[POLLUTANTS] = out[POLLUTANTS].astype(float).round(API_DECIMALS).fillna(0.0)
+    return out
+
+
+class CheckpointedWriter:
+    """
+    Streams batch-run records to a CSV file in batches instead of holding them all in memory.
+    Records go to `<output>.partial`; after each flush the written cities are appended to a
+    checkpoint file, so an interrupted run can be resumed and skip everything already on disk.
+    The partial file replaces the output only when the run finishes cleanly with some rows,
+    so a failed run leaves the previous output in place.
+    `on_flush`, if given, is called with each written (transformed) batch.
+    """
+
+    def __init__(self, output_file, checkpoint_file=None, batch_size=200, resume=False, transform=None,
+                 on_flush=None):
+        self.output_file = output_file
+        self.partial_file = f"{output_file}.partial"
+        self.checkpoint_file = checkpoint_file or f"{output_file}.checkpoint"
+        self.batch_size = batch_size
+        self.transform = transform
+        self.on_flush = on_flush
+        self.written = 0
+        self._buffer = []
+        self.completed = set()
+
+        if resume and os.path.exists(self.checkpoint_file) and os.path.exists(self.partial_file):
+            with open(self.checkpoint_file, encoding="utf-8") as f:
+                self.completed = {line.rstrip("\n") for line in f if line.strip()}
+        else:
+            # Fresh run: start both files empty; the previous output stays until this run finishes
+            for path in (self.partial_file, self.checkpoint_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def is_done(self, city, lat, lon):
+        return record_key(city, lat, lon) in self.completed
+
+    def write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends buffered records to the output file, syncs it to disk, then records them as done.
+        """
+        if not self._buffer:
+            return
+        import pandas as pd
+
+        df = pd.DataFrame(self._buffer)
+        if self.transform is not None:
+            df = self.transform(df)
+
+        header = not os.path.exists(self.partial_file) or os.path.getsize(self.partial_file) == 0
+        with open(self.partial_file, "a", encoding="utf-8", newline="") as f:
+            df.to_csv(f, index=False, header=header)
+            f.flush()
+            os.fsync(f.fileno())
+
+        keys = [record_key(r['city'], r['lat'], r['lon']) for r in self._buffer]
+        with open(self.checkpoint_file, "a", encoding="utf-8") as f:
+            f.write("".join(k + "\n" for k in keys))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.completed.update(keys)
+        self.written += len(self._buffer)
+        self._buffer = []
+        if self.on_flush is not None:
+            self.on_flush(df)
+
+    def close(self, finished=True):
+        """
+        Flushes remaining records. Once the run has finished cleanly, the partial file replaces
+        the output (or is dropped if nothing was written) and the checkpoint is removed.
+        """
+        self.flush()
+        if not finished:
+            return
+        if self.written or self.completed:
+            os.replace(self.partial_file, self.output_file)
+        elif os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Keep the partial file and checkpoint if the run was interrupted so --resume can pick them up
+        self.close(finished=exc_type is None)
+        return False
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from mock_server import start_mock_server
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def bench_single_fetch(samples, cities_df):
+    """
+    Latency of one uncached fetch_aqi_history call (HTTP + parse + resample).
+    """
+    from aqi_api import fetch_aqi_history
+
+    timings = []
+    rows = cities_df.sample(n=samples, replace=len(cities_df) < samples, random_state=0)
+    for lat, lon in rows[['lat', 'lon']].itertuples(index=False, name=None):
+        start = time.perf_counter()
+        fetch_aqi_history(lat, lon)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "samples": len(timings),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def bench_batch(workdir, cities_df, workers, grid_size):
+    """
+    Runs app.main() over `cities_df` in a scratch directory and measures cities/second.
+    The rate limit is lifted so the measurement reflects the fetch pipeline, not the quota.
+    """
+    cities_df.to_csv(os.path.join(workdir, "India_Cities.csv"), index=False)
+    cmd = [sys.executable, os.path.join(REPO_DIR, "app.py"),
+           "--workers", str(workers), "--rate", "1000000", "--grid-size", str(grid_size)]
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=workdir, env=os.environ.copy(), check=True, stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+
+    output = os.path.join(workdir, "India_All_Cities_AQI.csv")
+    written = len(pd.read_csv(output, usecols=['city'])) if os.path.exists(output) else 0
+    return {
+        "cities": len(cities_df),
+        "written": written,
+        "workers": workers,
+        "grid_size": grid_size,
+        "seconds": round(elapsed, 3),
+        "cities_per_second": round(len(cities_df) / elapsed, 2),
+    }
+
+
+# Modules that must stay cheap to import (no pandas/requests at import time)
+LIGHT_MODULES = ["aqi_api", "app", "transport", "cache", "rate_limiter", "grid", "batch_writer"]
+
+
+def _time_python(code, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True,
+                       env={k: v for k, v in os.environ.items() if k != "OPENWEATHER_API_KEY"})
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def bench_imports(budget_ms, repeats=3):
+    """
+    Cold import time of each light module in a fresh interpreter, net of interpreter startup.
+    Runs without OPENWEATHER_API_KEY to check that importing needs no configuration.
+    """
+    baseline = _time_python("pass", repeats)
+    modules = {}
+    for module in LIGHT_MODULES:
+        modules[module] = round(max(0.0, _time_python(f"import {module}", repeats) - baseline), 1)
+    over = [m for m, ms in modules.items() if ms > budget_ms]
+    return {"interpreter_ms": round(baseline, 1), "budget_ms": budget_ms, "modules_ms": modules, "over_budget": over}
+
+
+def bench_dashboard(workdir, runs):
+    """
+    Render time of the dashboard script via Streamlit's AppTest harness (skipped if unavailable).
+    """
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit not installed"}
+
+    timings = []
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for _ in range(runs):
+            at = AppTest.from_file(os.path.join(REPO_DIR, "dashboard.py"), default_timeout=60)
+            start = time.perf_counter()
+            at.run()
+            timings.append((time.perf_counter() - start) * 1000)
+            if at.exception:
+                return {"error": str(at.exception[0].message)}
+    finally:
+        os.chdir(cwd)
+    return {
+        "runs": len(timings),
+        "first_ms": round(timings[0], 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+    }
+
+
+# (section, metric, higher_is_better) pairs compared against a baseline run
+COMPARED_METRICS = [
+    ("single_fetch", "p50_ms", False),
+    ("single_fetch", "p95_ms", False),
+    ("dashboard", "p50_ms", False),
+    ("batch", "cities_per_second", True),
+]
+
+
+def compare(results, baseline):
+    """
+    Prints the change of each headline metric relative to a previous results file.
+    """
+    print("\n--- Compared to baseline ---")
+    for section, metric, higher_is_better in COMPARED_METRICS:
+        old = baseline.get(section, {}).get(metric)
+        new = results.get(section, {}).get(metric)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        print(f"{section}.{metric}: {old} -> {new} ({change:+.1f}%, {'better' if better else 'worse'})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline AQI pipeline benchmarks against a mock API.")
+    parser.add_argument("--cities", type=int, default=200, help="Cities in the batch benchmark (default: 200)")
+    parser.add_argument("--samples", type=int, default=50, help="Single-city fetches to time (default: 50)")
+    parser.add_argument("--dashboard-runs", type=int, default=3, help="Dashboard renders to time (default: 3)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--grid-size", type=float, default=0)
+    parser.add_argument("--latency", type=float, default=50.0, help="Mock API latency in ms (default: 50)")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Mock API jitter in ms (default: 10)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None, help="Mock API calls per minute before 429s")
+    parser.add_argument("--import-budget-ms", type=float, default=100.0,
+                        help="Max cold import time per light module, net of interpreter startup (default: 100)")
+    parser.add_argument("--imports-only", action="store_true",
+                        help="Only run the import-time check; exits non-zero if a module is over budget")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("Timing cold imports...")
+    imports = bench_imports(args.import_budget_ms)
+    if args.imports_only:
+        print(json.dumps(imports, indent=2))
+        if imports["over_budget"]:
+            print(f"Over the {args.import_budget_ms} ms import budget: {', '.join(imports['over_budget'])}")
+            sys.exit(1)
+        return
+
+    server, base_url, state = start_mock_server(
+        latency_ms=args.latency, jitter_ms=args.jitter,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, seed=0,
+    )
+    workdir = tempfile.mkdtemp(prefix="aqi-bench-")
+    # Configuration is read at call time, so setting it here is enough for this process and subprocesses
+    os.environ.update({
+        "OPENWEATHER_BASE_URL": base_url,
+        "OPENWEATHER_API_KEY": os.environ.get("OPENWEATHER_API_KEY", "benchmark"),
+        "AQI_CACHE_DISABLED": "1",
+        "AQI_HISTORY_PATH": os.path.join(workdir, "history.sqlite"),
+    })
+
+    try:
+        cities_df = pd.read_csv(os.path.join(REPO_DIR, "India_Cities.csv"))
+        shutil.copy(os.path.join(REPO_DIR, "India_Cities.csv"), workdir)
+
+        results = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "imports": imports,
+            "mock": {"latency_ms": args.latency, "jitter_ms": args.jitter,
+                     "error_rate": args.error_rate, "rate_limit": args.rate_limit},
+        }
+
+        print("Timing single-city fetch and parse...")
+        results["single_fetch"] = bench_single_fetch(args.samples, cities_df)
+
+        print("Timing dashboard render...")
+        results["dashboard"] = bench_dashboard(workdir, args.dashboard_runs)
+
+        print(f"Timing batch run over {args.cities} cities...")
+        batch_dir = tempfile.mkdtemp(prefix="aqi-bench-batch-", dir=workdir)
+        os.environ["AQI_HISTORY_PATH"] = os.path.join(batch_dir, "history.sqlite")
+        results["batch"] = bench_batch(batch_dir, cities_df.head(args.cities), args.workers, args.grid_size)
+
+        results["mock"]["requests"] = dict(state.counts)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.getenv("AQI_CACHE_PATH", ".aqi_cache.sqlite")
+DEFAULT_TTL = int(os.getenv("AQI_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("AQI_CACHE_MAX_ENTRIES", "20000"))
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+class ResponseCache:
+    """
+    Disk-backed TTL cache for API responses, shared safely between processes via SQLite.
+    Entries expire after `ttl` seconds and the least recently used ones are evicted
+    once the cache holds more than `max_entries`.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self):
+        # One connection per thread; WAL lets readers and a writer in another process proceed together
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO stats(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        """
+        Returns the cached payload for `key`, or None if missing or expired.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count(conn, "misses")
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, payload):
+        """
+        Stores a JSON-serializable payload under `key` and evicts LRU entries over the size bound.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses(key, payload, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), now, now),
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM stats")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns hit/miss counters for this process and across all processes sharing the file.
+        """
+        with self._connect() as conn:
+            totals = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+            "entries": entries,
+        }
+
+
+def make_key(lat, lon, start, end, precision=2):
+    """
+    Builds a cache key from rounded coordinates, the window start and the hour bucket of its end.
+    Requests ending within the same hour share an entry; the provider publishes hourly.
+    """
+    return f"{round(float(lat), precision)}:{round(float(lon), precision)}:{int(start)}:{int(end) // 3600}"
+
+
+def get_default_cache():
+    """
+    Returns the process-wide cache, or None if disabled via AQI_CACHE_DISABLED.
+    """
+    global _default_cache
+    if os.getenv("AQI_CACHE_DISABLED"):
+        return None
+    if _default_cache is None:
+        # Workers call this concurrently; only one of them may open the cache
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Points per trace sent to the browser; about one every 2-3 px at the dashboard's chart width
+CHART_POINTS = 400
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the sorted indices of `n_out` points
+    that keep the visual shape of (x, y): the first and last points plus, per bucket, the point
+    forming the largest triangle with the previous pick and the next bucket's average.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Gaps would poison the triangle areas; pick as if they held the mean, plot the real values
+    if np.isnan(y).any():
+        y = np.where(np.isnan(y), np.nanmean(y) if not np.isnan(y).all() else 0.0, y)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def chart_series(df, columns, n_out=CHART_POINTS):
+    """
+    Prepares columns of a time-indexed frame for plotting with one shared x array.
+    Each column is downsampled with LTTB and the union of the picked rows is kept, so every
+    trace keeps its own peaks while all traces use the same x values.
+    Returns (x as epoch milliseconds, {column: float32 values}); numeric arrays are sent to
+    the browser as compact binary instead of per-point date strings.
+    """
+    x = df.index.as_unit("ms").asi8.astype(float)
+    if len(df) > n_out:
+        keep = np.unique(np.concatenate([lttb(x, df[c].to_numpy(dtype=float), n_out) for c in columns]))
+    else:
+        keep = np.arange(len(df))
+    return x[keep], {c: df[c].to_numpy(dtype=np.float32)[keep] for c in columns}
@@ -1,43 +1,213 @@
+import bisect
+import math
 import pandas as pd
+import numpy as np
 import os
 
 _cities_df = None
+_city_index = None
+
+# Grid cell size (degrees) of the nearest-city index
+NEAREST_CELL_SIZE = 0.5
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km; vectorized over NumPy arrays.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class CityIndex:
+    """
+    Lookup structures over the cities DataFrame, built once at load time:
+    - a hash map from name (and disambiguated label) to row positions, keeping every duplicate
+    - a sorted, lower-cased label list for prefix (type-ahead) search
+    - a lat/lon grid for nearest-city queries
+    Cities sharing a name get labels like "Name (State)" or "Name (lat, lon)".
+    """
+
+    def __init__(self, df, cell_size=NEAREST_CELL_SIZE):
+        self.df = df.reset_index(drop=True)
+        self.names = self.df['city'].to_numpy()
+        self.lats = self.df['lat'].to_numpy(dtype=float)
+        self.lons = self.df['lon'].to_numpy(dtype=float)
+        self.states = self.df['state'].to_numpy() if 'state' in self.df.columns else None
+        self.cell_size = cell_size
+
+        self._by_name = {}
+        for pos, name in enumerate(self.names):
+            self._by_name.setdefault(name, []).append(pos)
+
+        self.labels = np.empty(len(self.df), dtype=object)
+        for name, positions in self._by_name.items():
+            if len(positions) == 1:
+                self.labels[positions[0]] = name
+                continue
+            for pos in positions:
+                self.labels[pos] = self._disambiguate(pos)
+
+        self._by_label = {label: pos for pos, label in enumerate(self.labels)}
+        self.sorted_labels = sorted(self._by_label)
+        pairs = sorted((label.lower(), label) for label in self._by_label)
+        self._prefix_keys = [p[0] for p in pairs]
+        self._prefix_labels = [p[1] for p in pairs]
+
+        self._grid = {}
+        cells_lat = np.floor(self.lats / cell_size).astype(int)
+        cells_lon = np.floor(self.lons / cell_size).astype(int)
+        for pos, cell in enumerate(zip(cells_lat, cells_lon)):
+            self._grid.setdefault(cell, []).append(pos)
+
+    def _disambiguate(self, pos):
+        state = self.states[pos] if self.states is not None else None
+        if isinstance(state, str) and state:
+            label = f"{self.names[pos]} ({state})"
+            # Same name twice in one state still needs coordinates
+            if sum(1 for p in self._by_name[self.names[pos]] if self.states[p] == state) == 1:
+                return label
+        return f"{self.names[pos]} ({self.lats[pos]:.2f}, {self.lons[pos]:.2f})"
+
+    def __len__(self):
+        return len(self.df)
+
+    def lookup(self, name):
+        """
+        Returns the row positions matching a city name or disambiguated label.
+        """
+        if name in self._by_label and name not in self._by_name:
+            return [self._by_label[name]]
+        return list(self._by_name.get(name, []))
+
+    def resolve(self, name, state=None, near=None):
+        """
+        Picks one row position for `name`. Duplicates are resolved by `state` if given,
+        then by distance to `near` (lat, lon), falling back to the first in file order.
+        """
+        positions = self.lookup(name)
+        if not positions:
+            return None
+        if len(positions) > 1 and state is not None and self.states is not None:
+            positions = [p for p in positions if self.states[p] == state] or positions
+        if len(positions) > 1 and near is not None:
+            dist = haversine_km(near[0], near[1], self.lats[positions], self.lons[positions])
+            return positions[int(np.argmin(dist))]
+        return positions[0]
+
+    def get_coords(self, name, state=None, near=None):
+        pos = self.resolve(name, state=state, near=near)
+        if pos is None:
+            return None, None
+        return self.lats[pos], self.lons[pos]
+
+    def search_prefix(self, prefix, limit=10):
+        """
+        Case-insensitive prefix search over city labels, in alphabetical order.
+        """
+        key = prefix.lower()
+        start = bisect.bisect_left(self._prefix_keys, key)
+        results = []
+        for i in range(start, len(self._prefix_keys)):
+            if not self._prefix_keys[i].startswith(key) or len(results) >= limit:
+                break
+            results.append(self._prefix_labels[i])
+        return results
+
+    def nearest_positions(self, lat, lon, k=1):
+        """
+        Returns (row positions, distances in km) of the `k` closest cities to (lat, lon).
+        Searches rings of grid cells outward until no unseen cell can hold anything closer.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.array([], dtype=int), np.array([], dtype=float)
+        cy, cx = int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+        candidates = []
+        max_ring = int(180 / self.cell_size)
+        for ring in range(max_ring + 1):
+            for dy in range(-ring, ring + 1):
+                for dx in range(-ring, ring + 1):
+                    if max(abs(dy), abs(dx)) == ring:
+                        candidates.extend(self._grid.get((cy + dy, cx + dx), ()))
+            if len(candidates) < k:
+                continue
+            dist = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+            kth = np.partition(dist, k - 1)[k - 1]
+            # Anything outside the searched rings is at least `ring` cells away in lat or lon
+            edge_lat = min(abs(lat) + ring * self.cell_size, 89.0)
+            bound = ring * self.cell_size * math.radians(1) * EARTH_RADIUS_KM * math.cos(math.radians(edge_lat))
+            if kth <= bound:
+                break
+
+        candidates = np.asarray(candidates)
+        dist = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        order = np.argsort(dist)[:k]
+        return candidates[order], dist[order]
+
+    def nearest(self, lat, lon, k=1):
+        """
+        Returns the `k` closest cities to (lat, lon) as a DataFrame with a `distance_km` column.
+        """
+        positions, dist = self.nearest_positions(lat, lon, k=k)
+        result = self.df.iloc[positions].copy()
+        result['distance_km'] = dist
+        return result
+
 
 def load_cities(file_path="India_Cities.csv"):
     """
     Loads city data from a CSV file.
     """
-    global _cities_df
+    global _cities_df, _city_index
     if _cities_df is not None:
         return _cities_df
 
     if not os.path.exists(file_path):
         # Fallback empty DF if file missing
         return pd.DataFrame(columns=['city', 'lat', 'lon'])
-    
+
     try:
         df = pd.read_csv(file_path)
         # Ensure columns exist
         required = ['city', 'lat', 'lon']
         if not all(col in df.columns for col in required):
             return pd.DataFrame(columns=required)
-        
+
         # Clean data
         df['city'] = df['city'].astype(str).str.strip()
-        
+
         _cities_df = df
+        _city_index = CityIndex(df)
         return df
     except Exception:
         return pd.DataFrame(columns=['city', 'lat', 'lon'])
 
+def get_city_index():
+    """
+    Returns the index built over the loaded cities (None if no cities could be loaded).
+    """
+    load_cities()
+    return _city_index
+
 def get_all_cities():
-    df = load_cities()
-    if df.empty: return []
-    return sorted(df['city'].unique().tolist())
-
-def get_coords(city_name):
-    df = load_cities()
-    if df.empty: return None, None
-    row = df[df['city'] == city_name]
-    if row.empty: return None, None
-    return row.iloc[0]['lat'], row.iloc[0]['lon']
+    index = get_city_index()
+    if index is None: return []
+    return index.sorted_labels
+
+def get_coords(city_name, state=None, near=None):
+    index = get_city_index()
+    if index is None: return None, None
+    return index.get_coords(city_name, state=state, near=near)
+
+def search_cities(prefix, limit=10):
+    index = get_city_index()
+    if index is None: return []
+    return index.search_prefix(prefix, limit=limit)
+
+def nearest_cities(lat, lon, k=1):
+    index = get_city_index()
+    if index is None: return pd.DataFrame(columns=['city', 'lat', 'lon', 'distance_km'])
+    return index.nearest(lat, lon, k=k)
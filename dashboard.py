@@ -1,15 +1,20 @@
-import streamlit as st
+import os
 import pandas as pd
-import plotly.express as px
+import streamlit as st
 import plotly.graph_objects as go
-from datetime import timedelta
 
 # Local modules
+import metrics
+from charts import chart_series
 from city_loader import get_all_cities, get_coords
-from aqi_api import fetch_aqi_history
-from utils import safe_value, get_aqi_category, get_aqi_color, health_recommendation
+from history_store import get_default_store
+from refresher import HistoryRefresher
+from snapshot import latest_snapshot_path, load_snapshot
+from utils import AQI_CATEGORIES, safe_value, get_aqi_category_from_aqi, get_aqi_color, category_recommendation, add_aqi_columns
 
 LINKEDIN_URL = "https://www.linkedin.com/in/aman-agarwal0309/"
+# Cities fetched per page run in comparison mode (selected city included)
+MAX_COMPARE_CITIES = 20
 
 
 
@@ -122,7 +127,12 @@ selected_city = st.sidebar.selectbox(
 # Update Session State
 st.session_state['selected_city'] = selected_city
 
-st.sidebar.button("+ Add Location") # Mock button
+compare_cities = st.sidebar.multiselect(
+    "+ Add Location",
+    [c for c in cities if c != selected_city],
+    max_selections=MAX_COMPARE_CITIES - 1,
+    help="Compare other cities against the selected one",
+)
 
 # --- Data Fetching ---
 lat, lon = get_coords(selected_city)
@@ -130,12 +140,58 @@ if lat is None:
     st.error("City coordinates not found.")
     st.stop()
 
-df = fetch_aqi_history(lat, lon)
+compare_coords = {city: get_coords(city) for city in compare_cities}
+compare_coords = {city: coords for city, coords in compare_coords.items() if coords[0] is not None}
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port):
+    # Once per server process; exposes /metrics and /metrics.json
+    return metrics.serve_metrics(port)
+
+if os.getenv("AQI_METRICS_PORT"):
+    start_metrics_server(int(os.getenv("AQI_METRICS_PORT")))
+
+@st.cache_resource(show_spinner=False)
+def get_refresher():
+    # One refresher per server process, shared by every session
+    refresher = HistoryRefresher(past_days=30, workers=MAX_COMPARE_CITIES).start()
+    for city in filter(None, (c.strip() for c in os.getenv("AQI_PINNED_CITIES", "").split(","))):
+        p_lat, p_lon = get_coords(city)
+        if p_lat is not None:
+            refresher.pin(p_lat, p_lon)
+    return refresher
+
+# Up to 30 days of history from the process-wide snapshot; hot cities never wait on the network.
+# Cities not in the snapshot yet are fetched concurrently so the page waits for the slowest one.
+with metrics.timer("dashboard_fetch_seconds"):
+    frames = get_refresher().get_many([(lat, lon)] + list(compare_coords.values()))
+df = frames[0]
+compare_frames = dict(zip(compare_coords, frames[1:]))
 
 if df is None or df.empty:
     st.error("No data available for this location.")
     st.stop()
 
+# CPCB sub-indices, overall AQI and category for the whole history in one pass
+df = add_aqi_columns(df)
+
+# Summary cards read the rollups maintained by the history store instead of scanning `df`
+store = get_default_store()
+
+def trailing_rollups(lat, lon):
+    table = store.rollups(lat, lon)
+    if table.empty:
+        # History stored before rollups existed
+        store.refresh_rollups(lat, lon)
+        table = store.rollups(lat, lon)
+    return table
+
+trailing = trailing_rollups(lat, lon)
+
+def rollup_value(table, column, stat, bucket):
+    row = table[(table.index == bucket) & (table['column'] == column)]
+    return row[stat].iloc[0] if not row.empty else None
+
 
 
 # Latest Data (from OpenWeather history)
@@ -149,7 +205,9 @@ current_o3   = safe_value(latest_row.get('o3'))
 current_so2  = safe_value(latest_row.get('so2'))
 current_co   = safe_value(latest_row.get('co'))
 
-category = get_aqi_category(current_pm25)
+current_aqi = safe_value(latest_row.get('aqi'))
+category = latest_row.get('aqi_category')
+dominant = latest_row.get('dominant_pollutant')
 color = get_aqi_color(category)
 
 
@@ -162,9 +220,9 @@ with col_left:
     # Gauge Chart
     fig_gauge = go.Figure(go.Indicator(
         mode = "gauge+number",
-        value = current_pm25,
+        value = current_aqi,
         domain = {'x': [0, 1], 'y': [0, 1]},
-        title = {'text': "PM2.5 AQI", 'font': {'color': 'white', 'size': 20}},
+        title = {'text': "AQI (CPCB)", 'font': {'color': 'white', 'size': 20}},
         number = {'font': {'color': color}},
         gauge = {
             'axis': {'range': [None, 500], 'tickwidth': 1, 'tickcolor': "white"},
@@ -191,6 +249,8 @@ with col_left:
     st.markdown('<div class="metric-card">', unsafe_allow_html=True)
     st.plotly_chart(fig_gauge, use_container_width=True)
     st.markdown(f'<p style="text-align: center; color: {color}; font-weight: bold; margin-top: -20px;">{category}</p>', unsafe_allow_html=True)
+    if isinstance(dominant, str):
+        st.markdown(f'<p style="text-align: center; color: #8b949e; font-size: 0.85rem; margin-top: -10px;">Dominant pollutant: {dominant.upper().replace("_", ".")}</p>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Pollutants Grid
@@ -292,74 +352,80 @@ with col_right:
     with c_head1:
         st.markdown(f"## AQI for {selected_city}")
     with c_head2:
-        range_opt = st.selectbox("Range", ["24 Hours", "7 Days", "Last 5 Days"], label_visibility="collapsed")
+        range_opt = st.selectbox("Range", ["24 Hours", "Last 5 Days", "7 Days", "30 Days"], label_visibility="collapsed")
     
     # Chart Logic
     if range_opt == "24 Hours":
         plot_df = df.tail(24)
+    elif range_opt == "Last 5 Days":
+        plot_df = df.tail(24 * 5)  # OpenWeather free tier (max 5 days per request)
     elif range_opt == "7 Days":
-        plot_df = df.tail(24 * 5)  # OpenWeather free tier (max 5 days)
+        plot_df = df.tail(24 * 7)  # Longer ranges come from the local history store
     else:
         plot_df = df
 
 
     
-    # Dynamic Color for Chart
-    max_val = plot_df['pm2_5'].max()
-    chart_color = get_aqi_color(get_aqi_category(max_val))
+    # Dynamic Color for Chart (range max from the rollups; longer ranges use whole daily buckets)
+    if range_opt == "24 Hours" or trailing.empty:
+        max_val = trailing.loc[trailing['column'] == 'aqi', 'max'].iloc[-1:].max()
+    else:
+        daily = store.rollups(lat, lon, "day", since=plot_df.index[0].floor("D").timestamp())
+        max_val = daily.loc[daily['column'] == 'aqi', 'max'].max()
+    chart_color = get_aqi_color(get_aqi_category_from_aqi(max_val))
         
+    # Figures are built from downsampled series and reused until a new hour of data arrives
+    @st.cache_resource(max_entries=64, show_spinner=False)
+    @metrics.timed("render_figures_seconds")
+    def trend_figures(city, range_opt, latest_hour, chart_color, _plot_df):
+        x, ys = chart_series(_plot_df, ['pm2_5', 'pm10', 'no2'])
+        layout = dict(
+            template="plotly_dark",
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            margin=dict(l=0, r=0, t=10, b=0),
+            height=280,
+            xaxis=dict(type="date", title=""),
+        )
+
+        fig = go.Figure(go.Scatter(x=x, y=ys['pm2_5'], mode='lines', fill='tozeroy', name='PM2.5', line=dict(color=chart_color)))
+        fig.update_layout(**layout, yaxis_title="PM2.5", showlegend=False)
+
+        fig_multi = go.Figure()
+        fig_multi.add_trace(go.Scatter(x=x, y=ys['pm2_5'], mode='lines', name='PM2.5', line=dict(color='#FF9900')))
+        fig_multi.add_trace(go.Scatter(x=x, y=ys['pm10'], mode='lines', name='PM10', line=dict(color='#FFFF00')))
+        fig_multi.add_trace(go.Scatter(x=x, y=ys['no2'], mode='lines', name='NO2', line=dict(color='#00B050')))
+        fig_multi.update_layout(
+            **layout,
+            yaxis_title="Concentration (µg/m³)",
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        )
+        return fig, fig_multi
+
+    fig, fig_multi = trend_figures(selected_city, range_opt, plot_df.index[-1], chart_color, plot_df)
+
     # Trend Chart (PM2.5)
     st.markdown('<div class="metric-card">', unsafe_allow_html=True)
     st.markdown("#### PM2.5 Trend")
-    
-    fig = px.area(plot_df, x=plot_df.index, y='pm2_5', 
-                  template="plotly_dark",
-                  color_discrete_sequence=[chart_color])
-    
-    fig.update_layout(
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        margin=dict(l=0, r=0, t=10, b=0),
-        height=280,
-        xaxis_title="",
-        yaxis_title="PM2.5",
-        showlegend=False
-    )
     st.plotly_chart(fig, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Multi-Pollutant Chart
     st.markdown('<div class="metric-card">', unsafe_allow_html=True)
     st.markdown("#### Multi-Pollutant Comparison")
-    
-    fig_multi = go.Figure()
-    fig_multi.add_trace(go.Scatter(x=plot_df.index, y=plot_df['pm2_5'], mode='lines', name='PM2.5', line=dict(color='#FF9900')))
-    fig_multi.add_trace(go.Scatter(x=plot_df.index, y=plot_df['pm10'], mode='lines', name='PM10', line=dict(color='#FFFF00')))
-    fig_multi.add_trace(go.Scatter(x=plot_df.index, y=plot_df['no2'], mode='lines', name='NO2', line=dict(color='#00B050')))
-    
-    fig_multi.update_layout(
-        template="plotly_dark",
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        margin=dict(l=0, r=0, t=10, b=0),
-        height=280,
-        xaxis_title="",
-        yaxis_title="Concentration (µg/m³)",
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
     st.plotly_chart(fig_multi, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Bottom Cards
     bc1, bc2, bc3 = st.columns(3)
     
-    # 24h Avg
-    last_24h = df.tail(24)
-    avg_24h = safe_value(last_24h['pm2_5'].mean())
+    # 24h Avg (trailing windows end at the index time; the earlier one is the previous 24h)
+    last_window = trailing.index.max() if not trailing.empty else None
+    avg_24h = safe_value(rollup_value(trailing, 'pm2_5', 'mean', last_window))
     
     # Previous 24h (for comparison)
-    if len(df) >= 48:
-        prev_24h = df.iloc[-48:-24]['pm2_5'].mean()
+    prev_24h = rollup_value(trailing, 'pm2_5', 'mean', last_window - pd.Timedelta(days=1)) if last_window is not None else None
+    if prev_24h is not None:
         diff = avg_24h - safe_value(prev_24h)
         diff_str = f"{diff:+.1f}"
     else:
@@ -375,7 +441,7 @@ with col_right:
         """, unsafe_allow_html=True)
         
     with bc2:
-        peak_val = safe_value(last_24h['pm2_5'].max())
+        peak_val = safe_value(rollup_value(trailing, 'pm2_5', 'max', last_window))
         st.markdown(f"""
         <div class="metric-card">
             <p style="color: #888; font-size: 0.8rem; margin:0;">📈 Peak (24h)</p>
@@ -385,7 +451,7 @@ with col_right:
         """, unsafe_allow_html=True)
         
     with bc3:
-        rec = health_recommendation(current_pm25)
+        rec = category_recommendation(category)
         st.markdown(f"""
         <div class="metric-card">
             <p style="color: #888; font-size: 0.8rem; margin:0;">🛡️ Recommendation</p>
@@ -393,6 +459,74 @@ with col_right:
         </div>
         """, unsafe_allow_html=True)
 
+# --- City Comparison ---
+if compare_coords:
+    st.markdown("## City Comparison")
+    metric_labels = {"AQI": "aqi", "PM2.5": "pm2_5", "PM10": "pm10", "NO2": "no2", "O3": "o3", "SO2": "so2", "CO": "co"}
+    metric_label = st.selectbox("Metric", list(metric_labels))
+    metric = metric_labels[metric_label]
+
+    # One column per city on a shared hourly index, limited to the selected range
+    series = {selected_city: df[metric]}
+    series.update({city: add_aqi_columns(f)[metric] for city, f in compare_frames.items() if not f.empty})
+    aligned = pd.DataFrame(series).sort_index()
+    aligned = aligned.reindex(pd.date_range(aligned.index.min(), aligned.index.max(), freq="h"))
+    aligned = aligned.loc[aligned.index >= plot_df.index[0]]
+
+    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+    x, ys = chart_series(aligned, list(aligned.columns))
+    fig_compare = go.Figure()
+    for city in aligned.columns:
+        fig_compare.add_trace(go.Scatter(x=x, y=ys[city], mode='lines', name=city, connectgaps=False))
+    fig_compare.update_layout(
+        template="plotly_dark",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        margin=dict(l=0, r=0, t=10, b=0),
+        height=320,
+        xaxis=dict(type="date", title=""),
+        yaxis_title=metric_label,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    st.plotly_chart(fig_compare, use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Ranking from the trailing-24h rollups (no raw history scan)
+    ranking = []
+    for city, (c_lat, c_lon) in [(selected_city, (lat, lon))] + list(compare_coords.items()):
+        table = trailing if city == selected_city else trailing_rollups(c_lat, c_lon)
+        window = table.index.max() if not table.empty else None
+        avg_aqi = rollup_value(table, 'aqi', 'mean', window)
+        ranking.append({
+            "City": city,
+            f"Current {metric_label}": aligned[city].dropna().iloc[-1] if city in aligned and aligned[city].notna().any() else None,
+            "24h Avg AQI": round(avg_aqi) if avg_aqi is not None else None,
+            "24h Peak AQI": rollup_value(table, 'aqi', 'max', window),
+            "24h Avg PM2.5": rollup_value(table, 'pm2_5', 'mean', window),
+            "Hours above standard (24h)": rollup_value(table, 'aqi', 'exceed_hours', window),
+            "Category": get_aqi_category_from_aqi(avg_aqi),
+        })
+    ranking_df = pd.DataFrame(ranking).sort_values("24h Avg AQI", ascending=False, na_position="last")
+    ranking_df.insert(0, "Rank", range(1, len(ranking_df) + 1))
+    st.markdown("#### Ranking (24h average AQI)")
+    st.dataframe(ranking_df.round(1), use_container_width=True, hide_index=True)
+
+# --- Full Dataset (latest batch snapshot) ---
+@st.cache_data(show_spinner=False)
+def load_snapshot_cached(path, mtime, categories):
+    # mtime is part of the cache key so a new batch run is picked up
+    return load_snapshot(path, categories=list(categories) or None)
+
+with st.expander("All Cities (latest batch run)"):
+    snapshot_path = latest_snapshot_path()
+    if not os.path.exists(snapshot_path):
+        st.info("No snapshot yet. Run `python app.py` to generate one.")
+    else:
+        selected_categories = st.multiselect("AQI Category", AQI_CATEGORIES)
+        snapshot_df = load_snapshot_cached(snapshot_path, os.path.getmtime(snapshot_path), tuple(selected_categories))
+        st.caption(f"{len(snapshot_df)} cities from {snapshot_path}")
+        st.dataframe(snapshot_df, use_container_width=True, hide_index=True)
+
 # Footer
 st.markdown("---")
 
@@ -1,81 +1,274 @@
-import requests
-import pandas as pd
-import time
+import argparse
+import codecs
+import csv
+import json
 import os
+import transport
 
-def fetch_cities_overpass():
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+# Place types fetched by default; widen with --places (e.g. add village|locality)
+DEFAULT_PLACES = "city|town|municipality|municipal_corporation"
+OUTPUT_FILE = "India_Cities.csv"
+
+# Bytes read from the response (or dump) at a time
+READ_CHUNK_BYTES = 1 << 16
+# Rows buffered before each append to the output file
+WRITE_CHUNK_ROWS = 5000
+# Same-name places closer than this are treated as one place
+DEDUPE_KM = 5.0
+
+
+def build_query(places=DEFAULT_PLACES, admin_level_8=True):
     """
-    Fetches cities, towns, and major localities in India using the Overpass API.
+    Overpass query for named place nodes in India (area of the ISO3166-1 "IN" relation).
     """
-    # Overpass Query
-    # We query for nodes with place tags in the area of India (ID 3600304716)
-    # We include: city, town, municipality, municipal_corporation
-    query = """
+    # We include: city, town, municipality, municipal_corporation (plus admin_level 8 nodes)
+    admin = '\n      node["admin_level"="8"](area.searchArea);' if admin_level_8 else ""
+    return f"""
     [out:json][timeout:180];
     area["ISO3166-1"="IN"]->.searchArea;
     (
-      node["place"~"city|town|municipality|municipal_corporation"](area.searchArea);
-      node["admin_level"="8"](area.searchArea); 
+      node["place"~"{places}"](area.searchArea);{admin}
     );
     out body;
     """
-    
-    url = "https://overpass-api.de/api/interpreter"
-    
-    print("Fetching data from Overpass API... (This may take a few seconds)")
+
+
+def stream_overpass(query, save_dump=None):
+    """
+    Yields the raw Overpass response in chunks, optionally copying it to `save_dump` as it arrives.
+    """
+    # Overpass queries can run for up to the 180s server-side timeout
+    response = transport.request("POST", OVERPASS_URL, data={'data': query}, timeout=200, stream=True)
+    response.raise_for_status()
+    dump = open(save_dump, "wb") if save_dump else None
     try:
-        response = requests.post(url, data={'data': query})
-        response.raise_for_status()
-        data = response.json()
-        
-        elements = data.get('elements', [])
-        print(f"Received {len(elements)} raw elements.")
-        
-        cities = []
-        for el in elements:
-            tags = el.get('tags', {})
-            name = tags.get('name')
-            if not name:
+        for chunk in response.iter_content(chunk_size=READ_CHUNK_BYTES):
+            if dump is not None:
+                dump.write(chunk)
+            yield chunk
+    finally:
+        response.close()
+        if dump is not None:
+            dump.close()
+
+
+def stream_dump(path):
+    """
+    Yields a saved Overpass JSON response in chunks.
+    """
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_elements(chunks):
+    """
+    Incrementally parses the `elements` array of an Overpass JSON response, yielding one element
+    dict at a time. Only the current partial element is buffered, never the whole response.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buf, pos = "", 0
+    in_array = done = False
+    tail = ""
+
+    for chunk in chunks:
+        if done:
+            # Overpass reports runtime errors (e.g. timeouts) in a "remark" after the array
+            tail = (tail + text.decode(chunk))[-4096:]
+            continue
+        buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+        if not in_array:
+            start = buf.find('"elements"')
+            bracket = buf.find("[", start) if start >= 0 else -1
+            if bracket < 0:
+                # Keep enough to match a key split across chunks
+                buf = buf[start:] if start >= 0 else buf[-16:]
                 continue
-                
-            cities.append({
-                'city': name,
-                'lat': el.get('lat'),
-                'lon': el.get('lon')
-            })
-            
-        df = pd.DataFrame(cities)
-        
-        # Clean up
-        df.drop_duplicates(subset=['city'], inplace=True)
-        
-        # Filter out non-English names if possible (optional, but good for consistency)
-        # For now, just basic cleaning
-        df['city'] = df['city'].str.strip()
-        
-        return df
-        
+            pos, in_array = bracket + 1, True
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                done = True
+                tail = buf[pos + 1:]
+                break
+            try:
+                element, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Element continues in the next chunk
+                break
+            yield element
+
+    if not done:
+        raise ValueError("Overpass response ended before the elements array was complete")
+    if '"remark"' in tail:
+        try:
+            remark = json.loads("{" + tail[tail.find('"remark"'):].rstrip().rstrip("}") + "}")["remark"]
+        except (ValueError, KeyError):
+            remark = tail.strip()
+        print(f"Warning: Overpass reported: {remark}")
+
+
+def iter_places(elements):
+    """
+    Yields (name, lat, lon) for every named node with coordinates.
+    """
+    for el in elements:
+        name = (el.get('tags') or {}).get('name', '').strip()
+        lat, lon = el.get('lat'), el.get('lon')
+        if name and lat is not None and lon is not None:
+            yield name, lat, lon
+
+
+class PlaceDeduper:
+    """
+    Drops a place if one with the same (case-insensitive) name was already kept within `radius_km`.
+    Distinct towns sharing a name are kept. Kept places are keyed by (name, grid cell), so each
+    check only looks at the 3x3 neighbouring cells. To keep memory small at village scale,
+    coordinates are packed into one int per place.
+    """
+
+    def __init__(self, radius_km=DEDUPE_KM):
+        from city_loader import haversine_km
+
+        self.radius_km = radius_km
+        self._distance = haversine_km
+        # Cell edge of 2x the radius in latitude degrees: still >= radius in longitude up to 60°N
+        self.cell = 2 * radius_km / 111.0
+        self._seen = {}
+        self.dropped = 0
+
+    @staticmethod
+    def _pack(lat, lon):
+        # Micro-degrees (~0.1 m) are plenty for a km-scale distance check
+        return (round((lat + 90) * 1e6) << 32) | round((lon + 180) * 1e6)
+
+    @staticmethod
+    def _unpack(packed):
+        return (packed >> 32) / 1e6 - 90, (packed & 0xFFFFFFFF) / 1e6 - 180
+
+    def add(self, name, lat, lon):
+        name = name.casefold()
+        ci, cj = int(lat // self.cell), int(lon // self.cell)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                entry = self._seen.get((name, ci + di, cj + dj))
+                if entry is None:
+                    continue
+                for other in (entry if isinstance(entry, list) else (entry,)):
+                    if self._distance(lat, lon, *self._unpack(other)) <= self.radius_km:
+                        self.dropped += 1
+                        return False
+
+        key = (name, ci, cj)
+        packed = self._pack(lat, lon)
+        entry = self._seen.get(key)
+        if entry is None:
+            self._seen[key] = packed
+        elif isinstance(entry, list):
+            entry.append(packed)
+        else:
+            self._seen[key] = [entry, packed]
+        return True
+
+
+def write_places(places, output_file=OUTPUT_FILE, chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Writes (name, lat, lon) rows to CSV in chunks of `chunk_rows`. The file is written under a
+    temporary name and swapped in at the end, so readers never see a partial list. If no rows
+    were written, the existing file is left as it is. Returns the number of rows written.
+    """
+    tmp_path = output_file + ".tmp"
+    written = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(['city', 'lat', 'lon'])
+        rows = []
+        for row in places:
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                writer.writerows(rows)
+                written += len(rows)
+                rows = []
+        writer.writerows(rows)
+        written += len(rows)
+    if written:
+        os.replace(tmp_path, output_file)
+    else:
+        os.remove(tmp_path)
+    return written
+
+
+def unique_places(chunks, radius_km=DEDUPE_KM):
+    """
+    Streams deduplicated (name, lat, lon) places out of raw Overpass response chunks.
+    """
+    deduper = PlaceDeduper(radius_km)
+    for name, lat, lon in iter_places(iter_elements(chunks)):
+        if deduper.add(name, lat, lon):
+            yield name, lat, lon
+
+
+def fetch_cities_overpass(places=DEFAULT_PLACES, radius_km=DEDUPE_KM):
+    """
+    Fetches cities, towns, and major localities in India using the Overpass API.
+    Returns a DataFrame; use write_places(unique_places(...)) to stream straight to disk instead.
+    """
+    import pandas as pd
+
+    print("Fetching data from Overpass API... (This may take a few seconds)")
+    try:
+        rows = list(unique_places(stream_overpass(build_query(places)), radius_km))
     except Exception as e:
         print(f"Error fetching data: {e}")
         return pd.DataFrame()
+    return pd.DataFrame(rows, columns=['city', 'lat', 'lon'])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch named places in India from OpenStreetMap (Overpass API).")
+    parser.add_argument("--places", default=DEFAULT_PLACES,
+                        help=f"place=* values to fetch, as a regex (default: {DEFAULT_PLACES})")
+    parser.add_argument("--dump", help="Parse a saved Overpass JSON response instead of querying the API")
+    parser.add_argument("--save-dump", help="Also save the raw API response to this file")
+    parser.add_argument("--dedupe-km", type=float, default=DEDUPE_KM,
+                        help=f"Same-name places within this distance are merged (default: {DEDUPE_KM})")
+    parser.add_argument("--output", default=OUTPUT_FILE, help=f"Output CSV (default: {OUTPUT_FILE})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
 
-def main():
-    df = fetch_cities_overpass()
-    
-    if df.empty:
+    if args.dump:
+        print(f"Reading Overpass response from {args.dump}...")
+        chunks = stream_dump(args.dump)
+    else:
+        print("Fetching data from Overpass API... (This may take a few seconds)")
+        chunks = stream_overpass(build_query(args.places), save_dump=args.save_dump)
+
+    try:
+        count = write_places(unique_places(chunks, args.dedupe_km), args.output)
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        if os.path.exists(args.output + ".tmp"):
+            os.remove(args.output + ".tmp")
+        return
+
+    if not count:
         print("No cities found or API error.")
         return
-        
-    print(f"Processed {len(df)} unique cities.")
-    
-    # Save
-    output_file = "India_Cities.csv"
-    df.to_csv(output_file, index=False)
-    print(f"Saved to {output_file}")
-    
-    # Preview
-    print(df.head())
-    print(f"Total Count: {len(df)}")
+    print(f"Saved {count} unique places to {args.output}")
+
 
 if __name__ == "__main__":
     main()
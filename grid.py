@@ -0,0 +1,39 @@
+# ~11 km at the equator, close to the resolution of the provider's air-quality model
+DEFAULT_CELL_SIZE = 0.1
+
+
+def plan_grid_cells(cities_df, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Assigns every city to a square lat/lon grid cell of `cell_size` degrees.
+    Adds `cell_lat` / `cell_lon` columns holding the cell centre, which is the point fetched
+    for every city in that cell. A cell size of 0 (or less) keeps each city's own coordinates.
+    """
+    df = cities_df.copy()
+    if not cell_size or cell_size <= 0:
+        df['cell_lat'] = df['lat']
+        df['cell_lon'] = df['lon']
+        return df
+
+    df['cell_lat'] = (((df['lat'] // cell_size) + 0.5) * cell_size).round(6)
+    df['cell_lon'] = (((df['lon'] // cell_size) + 0.5) * cell_size).round(6)
+    return df
+
+
+def unique_cells(planned_df):
+    """
+    Returns the distinct (cell_lat, cell_lon) pairs to fetch, in first-seen order.
+    """
+    return list(planned_df[['cell_lat', 'cell_lon']].drop_duplicates().itertuples(index=False, name=None))
+
+
+def bin_points(df, cell_size, value="aqi"):
+    """
+    Aggregates point rows (lat, lon, `value`) into grid cells of `cell_size` degrees.
+    Returns one row per non-empty cell: cell_lat, cell_lon (centre), count, mean and max of `value`.
+    """
+    planned = plan_grid_cells(df[['lat', 'lon', value]], cell_size)
+    return (
+        planned.groupby(['cell_lat', 'cell_lon'], sort=False)[value]
+        .agg(count='size', mean='mean', max='max')
+        .reset_index()
+    )
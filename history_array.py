@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from aqi_api import POLLUTANTS
+
+# Dense, memory-mapped copy of the history store for cross-city reads. Several processes can
+# map the same file; the OS page cache holds one copy however many readers there are.
+
+DEFAULT_ARRAY_DIR = os.getenv("AQI_HISTORY_ARRAY", ".aqi_history_array")
+# Hours held per location: the dashboard's longest range
+DEFAULT_HOURS = 30 * 24
+# Extra hours allocated past the current one, so the window is only rebuilt about once a day
+SLACK_HOURS = 24
+HOUR = 3600
+
+META_FILE = "meta.json"
+
+
+class HistoryArray:
+    """
+    Read view of a float32 array shaped (locations, hours, pollutants) on a memory-mapped .npy
+    file, with a location index and an hourly time axis. Missing hours are NaN.
+    Slices are views into the mapping: one location's hours are contiguous, and one hour across
+    all locations is a strided view, so neither copies.
+    """
+
+    def __init__(self, path, meta, values):
+        self.path = path
+        self.meta = meta
+        self.values = values
+        self.locations = meta["locations"]
+        self.index = {loc: i for i, loc in enumerate(self.locations)}
+        self.start = meta["start"]
+        self.hours = meta["hours"]
+        self.latest = meta["latest"]
+
+    @classmethod
+    def open(cls, path=DEFAULT_ARRAY_DIR, writable=False):
+        """
+        Maps the current array, or returns None if none has been built.
+        """
+        meta = read_meta(path)
+        if meta is None:
+            return None
+        values = np.load(os.path.join(path, meta["file"]), mmap_mode="r+" if writable else "r")
+        return cls(path, meta, values)
+
+    def is_current(self):
+        """
+        False once the array has been rebuilt under a new file; reopen to see the new window.
+        """
+        meta = read_meta(self.path)
+        return meta is not None and meta["file"] == self.meta["file"]
+
+    def index_of(self, lat, lon):
+        from history_store import location_key
+
+        return self.index.get(location_key(lat, lon))
+
+    def hour_index(self, ts):
+        """
+        Position of the hour holding unix time `ts` on the time axis.
+        """
+        return (int(ts) - self.start) // HOUR
+
+    def times(self, first=0, last=None):
+        """
+        Hour starts (datetime64[s]) for axis positions [first, last).
+        """
+        last = self.hours if last is None else last
+        return np.datetime64(self.start, "s") + np.arange(first, last) * np.timedelta64(HOUR, "s")
+
+    def city(self, lat, lon, hours=24):
+        """
+        (times, values) for the last `hours` hours with data at one location; values is a
+        (hours, pollutants) view. Returns None for an unknown location.
+        """
+        i = self.index_of(lat, lon)
+        if i is None or self.latest is None:
+            return None
+        end = self.hour_index(self.latest) + 1
+        first = max(0, end - hours)
+        return self.times(first, end), self.values[i, first:end]
+
+    def at(self, ts):
+        """
+        (locations, pollutants) view of every location at the hour holding `ts`.
+        """
+        t = self.hour_index(ts)
+        if not 0 <= t < self.hours:
+            raise IndexError(f"{ts} is outside the array's time axis")
+        return self.values[:, t]
+
+    def frame(self, lat, lon, past_days=None):
+        """
+        One location as a DataFrame like HistoryStore.load() returns (copies the rows).
+        """
+        import pandas as pd
+
+        series = self.city(lat, lon, hours=past_days * 24 if past_days else self.hours)
+        if series is None:
+            return pd.DataFrame()
+        times, values = series
+        df = pd.DataFrame(np.asarray(values, dtype=float), index=pd.DatetimeIndex(times, name="timestamp"),
+                          columns=POLLUTANTS)
+        return df.dropna(how="all")
+
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(path, meta):
+    tmp_path = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+
+def _fill(values, store, locations, rows, start, hours):
+    """
+    Copies stored readings of `locations` (mapped to array rows) into `values`; returns the
+    newest timestamp copied.
+    """
+    latest = None
+    end = start + hours * HOUR
+    for loc, row in zip(locations, rows):
+        data = store.readings(loc, start, end)
+        # Assemble the row first so readers of a shared mapping never see it half cleared
+        filled = np.full(values.shape[1:], np.nan, dtype=np.float32)
+        if data:
+            data = np.array(data, dtype=float)
+            filled[(data[:, 0].astype(np.int64) - start) // HOUR] = data[:, 1:]
+            newest = int(data[-1, 0])
+            latest = newest if latest is None else max(latest, newest)
+        values[row] = filled
+    return latest
+
+
+def build(path=DEFAULT_ARRAY_DIR, store=None, hours=DEFAULT_HOURS, now=None):
+    """
+    Writes a new array holding every location in the history store for the last `hours` hours
+    and switches readers to it. The previous file stays valid for processes still mapping it.
+    """
+    from history_store import get_default_store
+
+    store = store if store is not None else get_default_store()
+    now = int(time.time() if now is None else now)
+    start = (now // HOUR - hours + 1) * HOUR
+    total = hours + SLACK_HOURS
+    synced = time.time()
+
+    locations = store.locations()
+    os.makedirs(path, exist_ok=True)
+    name = f"values-{time.time_ns():x}.npy"
+    values = np.lib.format.open_memmap(os.path.join(path, name + ".tmp"), mode="w+", dtype=np.float32,
+                                       shape=(len(locations), total, len(POLLUTANTS)))
+    latest = _fill(values, store, locations, range(len(locations)), start, total)
+    values.flush()
+    del values
+    os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+
+    old = read_meta(path)
+    meta = {"file": name, "locations": locations, "start": start, "hours": total, "latest": latest,
+            "pollutants": POLLUTANTS, "synced": synced}
+    _write_meta(path, meta)
+    if old is not None and old["file"] != name:
+        # Readers still holding the old mapping keep it until they reopen
+        os.remove(os.path.join(path, old["file"]))
+    return HistoryArray.open(path)
+
+
+def sync(path=DEFAULT_ARRAY_DIR, store=None, hours=DEFAULT_HOURS, now=None):
+    """
+    Brings the array up to date with the history store. Locations merged since the last sync
+    are rewritten in place; new locations or an hour past the end of the time axis rebuild it.
+    """
+    from history_store import get_default_store
+
+    store = store if store is not None else get_default_store()
+    now = int(time.time() if now is None else now)
+    array = HistoryArray.open(path, writable=True)
+    if array is None or now >= array.start + array.hours * HOUR:
+        return build(path, store, hours, now)
+
+    synced = time.time()
+    changed = store.locations(checked_since=array.meta["synced"])
+    if any(loc not in array.index for loc in changed):
+        return build(path, store, hours, now)
+
+    latest = _fill(array.values, store, changed, [array.index[loc] for loc in changed], array.start, array.hours)
+    array.values.flush()
+    meta = dict(array.meta, synced=synced)
+    if latest is not None:
+        meta["latest"] = max(latest, array.latest or latest)
+    _write_meta(path, meta)
+    return HistoryArray.open(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the memory-mapped history array.")
+    parser.add_argument("--path", default=DEFAULT_ARRAY_DIR, help=f"Array directory (default: {DEFAULT_ARRAY_DIR})")
+    parser.add_argument("--hours", type=int, default=DEFAULT_HOURS, help=f"Hours per location (default: {DEFAULT_HOURS})")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from scratch instead of syncing")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    array = (build if args.rebuild else sync)(args.path, hours=args.hours)
+    size_mb = array.values.nbytes / 1e6
+    print(f"{len(array.locations)} locations x {array.hours} hours x {len(POLLUTANTS)} pollutants "
+          f"({size_mb:.1f} MB) in {args.path}, updated in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+import metrics
+from aqi_api import API_DECIMALS, POLLUTANTS, _request_history, parse_history, normalize_hourly
+from rollups import DAY, HOUR, TRAILING, STATS, bucket_start, compute_rollups, rollup_table
+
+DEFAULT_HISTORY_PATH = os.getenv("AQI_HISTORY_PATH", ".aqi_history.sqlite")
+
+# How far back a city with no stored history is seeded from the API
+MAX_FETCH_DAYS = 5
+# Recorded dashboard views lose half their weight every hour
+DEMAND_HALF_LIFE = 3600
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def location_key(lat, lon, precision=2):
+    """
+    Identifies a city's location in the store by its rounded coordinates.
+    """
+    return f"{round(float(lat), precision)}:{round(float(lon), precision)}"
+
+
+class HistoryStore:
+    """
+    Local hourly time-series store with a per-location watermark (last stored timestamp).
+    Keeps history beyond the provider's fetch window, plus daily / weekly / trailing-24h
+    rollups that are refreshed for the touched buckets whenever new readings are merged.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+        # SQLite allows one writer; queueing on a lock beats its sleep-and-retry busy handler
+        self._write_lock = threading.Lock()
+        columns = ", ".join(f"{p} REAL" for p in POLLUTANTS)
+        stats = ", ".join(f"{s} REAL" for s in STATS)
+        with self._connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS history (
+                    loc TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    {columns},
+                    PRIMARY KEY (loc, ts)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    loc TEXT PRIMARY KEY,
+                    last_ts INTEGER NOT NULL,
+                    checked REAL NOT NULL,
+                    first_ts INTEGER
+                )
+            """)
+            # Stores created before first_ts was tracked fall back to their oldest stored hour
+            if "first_ts" not in {row[1] for row in conn.execute("PRAGMA table_info(watermarks)")}:
+                conn.execute("ALTER TABLE watermarks ADD COLUMN first_ts INTEGER")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    loc TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    col TEXT NOT NULL,
+                    {stats},
+                    PRIMARY KEY (loc, period, bucket, col)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS demand (
+                    loc TEXT PRIMARY KEY,
+                    views REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_watermark(self, lat, lon):
+        """
+        Returns (last stored unix timestamp, last check time) or (None, None).
+        """
+        row = self._connect().execute(
+            "SELECT last_ts, checked FROM watermarks WHERE loc = ?", (location_key(lat, lon),)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def covered_since(self, lat, lon):
+        """
+        Returns the oldest unix timestamp fetched for a location (the start of the earliest
+        window requested, else its oldest stored reading), or None if nothing is stored.
+        """
+        loc = location_key(lat, lon)
+        row = self._connect().execute(
+            "SELECT COALESCE((SELECT first_ts FROM watermarks WHERE loc = ?), "
+            "(SELECT MIN(ts) FROM history WHERE loc = ?))",
+            (loc, loc),
+        ).fetchone()
+        return row[0]
+
+    @metrics.timed("store_merge_seconds")
+    def merge(self, lat, lon, df, since=None):
+        """
+        Upserts raw readings (DatetimeIndex, pollutant columns) and advances the watermark.
+        `since` is the start of the window the readings were fetched for; it extends how far
+        back the location counts as covered even when the provider had nothing that old.
+        """
+        loc = location_key(lat, lon)
+        now = time.time()
+        with self._write_lock, self._connect() as conn:
+            if not df.empty:
+                ts = (df.index - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+                values = df.reindex(columns=POLLUTANTS).astype(float).round(API_DECIMALS)
+                values = values.where(values.notna(), None)
+                rows = [(loc, int(t), *v) for t, v in zip(ts, values.itertuples(index=False, name=None))]
+                placeholders = ", ".join("?" for _ in range(len(POLLUTANTS) + 2))
+                conn.executemany(f"INSERT OR REPLACE INTO history VALUES ({placeholders})", rows)
+                last_ts = int(ts.max())
+                first_ts = int(ts.min()) if since is None else min(int(since), int(ts.min()))
+                self._refresh_rollups(conn, loc, int(ts.min()))
+            else:
+                last_ts = None
+                first_ts = None if since is None else int(since)
+            conn.execute(
+                "INSERT INTO watermarks(loc, last_ts, checked, first_ts) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(loc) DO UPDATE SET last_ts = MAX(last_ts, excluded.last_ts), checked = excluded.checked, "
+                "first_ts = COALESCE(MIN(first_ts, excluded.first_ts), first_ts, excluded.first_ts)",
+                (loc, last_ts if last_ts is not None else 0, now, first_ts),
+            )
+
+    @metrics.timed("rollup_seconds")
+    def _refresh_rollups(self, conn, loc, since):
+        """
+        Recomputes the rollup buckets touched by readings at or after `since`.
+        Only the raw hours those buckets cover are read back (at most a week plus two days).
+        """
+        latest = conn.execute("SELECT MAX(ts) FROM history WHERE loc = ?", (loc,)).fetchone()[0]
+        if latest is None:
+            return
+        trailing_start = (latest // HOUR + 1) * HOUR - 2 * DAY
+        start = min(int(bucket_start([since], "week")[0]), trailing_start)
+        rows = conn.execute(
+            f"SELECT ts, {', '.join(POLLUTANTS)} FROM history WHERE loc = ? AND ts >= ? ORDER BY ts",
+            (loc, start),
+        ).fetchall()
+        history = pd.DataFrame(rows, columns=["ts"] + POLLUTANTS).set_index("ts")
+
+        placeholders = ", ".join("?" for _ in range(len(STATS) + 4))
+        conn.execute("DELETE FROM rollups WHERE loc = ? AND period = ?", (loc, TRAILING))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO rollups VALUES ({placeholders})",
+            [(loc, *row) for row in compute_rollups(history, since)],
+        )
+
+    def refresh_rollups(self, lat, lon):
+        """
+        Rebuilds all rollups for a location from its stored history (e.g. for data stored
+        before rollups existed).
+        """
+        with self._write_lock, self._connect() as conn:
+            self._refresh_rollups(conn, location_key(lat, lon), 0)
+
+    def rollups(self, lat, lon, period=TRAILING, since=None):
+        """
+        Returns precomputed rollups for a location: one row per bucket and series (pollutants
+        and `aqi`) with mean, max, p95, exceed_hours and hours, indexed by bucket time.
+        For the trailing period the two buckets are the 24h windows ending at the index time.
+        """
+        query = f"SELECT bucket, col, {', '.join(STATS)} FROM rollups WHERE loc = ? AND period = ?"
+        params = [location_key(lat, lon), period]
+        if since is not None:
+            query += " AND bucket >= ?"
+            params.append(int(since))
+        rows = self._connect().execute(query + " ORDER BY bucket", params).fetchall()
+        return rollup_table(rows)
+
+    def ranking(self, column="aqi", stat="mean", period=TRAILING, n=10, ascending=False):
+        """
+        Ranks all stored locations by a rollup of their most recent bucket.
+        Returns a list of (location key, bucket time, value).
+        """
+        if stat not in STATS:
+            raise ValueError(f"unknown stat: {stat}")
+        order = "ASC" if ascending else "DESC"
+        rows = self._connect().execute(
+            f"""
+            SELECT r.loc, r.bucket, r.{stat} FROM rollups r
+            JOIN (SELECT loc, MAX(bucket) AS bucket FROM rollups WHERE period = ? AND col = ? GROUP BY loc) latest
+              ON r.loc = latest.loc AND r.bucket = latest.bucket
+            WHERE r.period = ? AND r.col = ? AND r.{stat} IS NOT NULL
+            ORDER BY r.{stat} {order} LIMIT ?
+            """,
+            (period, column, period, column, n),
+        ).fetchall()
+        return [(loc, pd.Timestamp(bucket, unit="s"), value) for loc, bucket, value in rows]
+
+    def record_views(self, counts, half_life=DEMAND_HALF_LIFE):
+        """
+        Adds view counts ({location key: views}) to the decaying per-location demand, so
+        processes other than the dashboard can see what is being looked at.
+        """
+        if not counts:
+            return
+        now = time.time()
+        with self._write_lock, self._connect() as conn:
+            placeholders = ", ".join("?" for _ in counts)
+            current = {loc: (views, updated) for loc, views, updated in conn.execute(
+                f"SELECT loc, views, updated FROM demand WHERE loc IN ({placeholders})", list(counts)
+            )}
+            rows = []
+            for loc, views in counts.items():
+                old, updated = current.get(loc, (0.0, now))
+                rows.append((loc, old * 0.5 ** ((now - updated) / half_life) + views, now))
+            conn.executemany("INSERT OR REPLACE INTO demand VALUES (?, ?, ?)", rows)
+
+    def demand(self, half_life=DEMAND_HALF_LIFE):
+        """
+        Returns the current decayed view count per location key.
+        """
+        now = time.time()
+        rows = self._connect().execute("SELECT loc, views, updated FROM demand").fetchall()
+        return {loc: views * 0.5 ** ((now - updated) / half_life) for loc, views, updated in rows}
+
+    def locations(self, checked_since=None):
+        """
+        Location keys in the store, optionally only those merged or checked since a unix time.
+        """
+        if checked_since is None:
+            rows = self._connect().execute("SELECT loc FROM watermarks ORDER BY loc")
+        else:
+            rows = self._connect().execute("SELECT loc FROM watermarks WHERE checked >= ? ORDER BY loc",
+                                           (checked_since,))
+        return [loc for (loc,) in rows]
+
+    def readings(self, loc, start, end):
+        """
+        Raw (ts, *pollutants) rows of a location key for start <= ts < end, oldest first.
+        """
+        return self._connect().execute(
+            f"SELECT ts, {', '.join(POLLUTANTS)} FROM history WHERE loc = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (loc, int(start), int(end)),
+        ).fetchall()
+
+    @metrics.timed("store_load_seconds")
+    def load(self, lat, lon, past_days=None):
+        """
+        Returns stored raw readings for a location, optionally limited to the last `past_days`.
+        """
+        query = f"SELECT ts, {', '.join(POLLUTANTS)} FROM history WHERE loc = ?"
+        params = [location_key(lat, lon)]
+        if past_days is not None:
+            query += " AND ts >= ?"
+            params.append(int(time.time()) - past_days * 24 * 3600)
+        query += " ORDER BY ts"
+
+        rows = self._connect().execute(query, params).fetchall()
+        if not rows:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(rows, columns=["timestamp"] + POLLUTANTS)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
+        return df.set_index("timestamp")
+
+
+def get_default_store():
+    """
+    Returns the process-wide store.
+    """
+    global _default_store
+    if _default_store is None:
+        # Batch workers call this concurrently; a second store would have its own write lock
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = HistoryStore()
+    return _default_store
+
+
+@metrics.timed("fetch_history_seconds")
+def fetch_history(lat, lon, past_days=5, limiter=None, store=None):
+    """
+    Returns hourly history for the last `past_days`, fetching only hours newer than the stored watermark.
+    The API is not called at all if the location was already refreshed during the current hour,
+    unless the caller needs older hours than were ever fetched for it (a shorter window came first).
+    """
+    store = store if store is not None else get_default_store()
+    now = int(time.time())
+    # Hour-aligned, so repeat requests within the hour share a response cache entry
+    earliest = (now // 3600 - min(past_days, MAX_FETCH_DAYS) * 24) * 3600
+    watermark, checked = store.get_watermark(lat, lon)
+    covered = store.covered_since(lat, lon)
+    missing_older = covered is not None and earliest < covered
+
+    if checked is None or int(checked) // 3600 < now // 3600:
+        start = earliest if not watermark or watermark < earliest or missing_older else watermark
+        res = _request_history(lat, lon, start, now, limiter=limiter)
+        # Error payloads leave the watermark untouched so the next call retries
+        if "list" in res:
+            store.merge(lat, lon, parse_history(res), since=start)
+    elif missing_older:
+        # Checked this hour, but only for a shorter window: fill in the hours before it
+        metrics.inc("history_extend_total")
+        res = _request_history(lat, lon, earliest, covered, limiter=limiter)
+        if "list" in res:
+            store.merge(lat, lon, parse_history(res), since=earliest)
+    else:
+        metrics.inc("history_fresh_total")
+
+    return normalize_hourly(store.load(lat, lon, past_days=past_days))
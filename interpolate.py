@@ -0,0 +1,245 @@
+import argparse
+import math
+import time
+import numpy as np
+from aqi_api import POLLUTANTS
+
+# India's bounding box (lat_min, lat_max, lon_min, lon_max) for the national grid
+INDIA_BOUNDS = (6.5, 37.5, 68.0, 97.5)
+GRID_STEP = 0.1
+# Readings combined per estimate, and how fast their weight falls off with distance
+DEFAULT_K = 8
+DEFAULT_POWER = 2.0
+# Places farther than this from every reading get no estimate rather than an extrapolation
+MAX_DISTANCE_KM = 100.0
+# Readings closer than this count as being at the query point
+MIN_DISTANCE_KM = 0.05
+# Bucket edge (degrees) of the neighbour index: ~15 snapshot cities per bucket over India
+BUCKET_DEG = 1.0
+KM_PER_DEG = 111.195
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lats, lons):
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _chord_to_km(chord2):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(chord2) / 2))
+
+
+class NeighbourIndex:
+    """
+    Static k-nearest-neighbour index over points, bucketed on a lat/lon grid.
+    Queries are answered per bucket: all query points in one bucket share the candidate set
+    gathered from rings of buckets around it. Rings stop growing once no unvisited bucket can
+    hold a closer point, or once they are farther than `max_km`. Distances are ranked by the
+    squared chord between unit vectors (one matrix product per bucket), which orders points
+    exactly like great-circle distance.
+    """
+
+    def __init__(self, lats, lons, bucket=BUCKET_DEG):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.bucket = bucket
+        self.units = _unit_vectors(self.lats, self.lons)
+        bi = np.floor(self.lats / bucket).astype(int)
+        bj = np.floor(self.lons / bucket).astype(int)
+        # Points sorted by bucket, so each bucket is one contiguous slice of positions
+        self.order = np.lexsort((bj, bi))
+        self._buckets = {key: self.order[rows] for key, rows in _group_slices(bi[self.order], bj[self.order])}
+
+    def _ring(self, ci, cj, r):
+        if r == 0:
+            cells = [(ci, cj)]
+        else:
+            cells = [(ci + d, cj + e) for d in range(-r, r + 1) for e in (-r, r)]
+            cells += [(ci + d, cj + e) for d in (-r, r) for e in range(-r + 1, r)]
+        return [self._buckets[c] for c in cells if c in self._buckets]
+
+    def _query_bucket(self, units, ci, cj, k, max_km):
+        edge_lat = min(89.0, max(abs(ci * self.bucket), abs((ci + 1) * self.bucket)))
+        ring_km = self.bucket * KM_PER_DEG * math.cos(math.radians(edge_lat))
+        candidates, n, r = [], 0, 0
+        while True:
+            ring = self._ring(ci, cj, r)
+            candidates += ring
+            n += sum(len(c) for c in ring)
+            # Points outside rings 0..r are at least r bucket edges away
+            exhausted = r * ring_km >= max_km
+            if exhausted or (n >= k and r > 0):
+                if n == 0:
+                    return None, None
+                cand = np.concatenate(candidates)
+                chord2 = np.maximum(0.0, 2.0 - 2.0 * (units @ self.units[cand].T))
+                if exhausted or _chord_to_km(np.partition(chord2, k - 1, axis=1)[:, k - 1].max()) <= r * ring_km:
+                    break
+            r += 1
+
+        if len(cand) > k:
+            nearest = np.argpartition(chord2, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.broadcast_to(np.arange(len(cand)), (len(units), len(cand)))
+        return cand[nearest], _chord_to_km(np.take_along_axis(chord2, nearest, axis=1))
+
+    def query(self, lats, lons, k=DEFAULT_K, max_km=MAX_DISTANCE_KM):
+        """
+        Returns (positions, distances in km), both shaped (n, k), of the k nearest points to each
+        query. Slots without a point within `max_km` hold position -1 and distance inf.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        units = _unit_vectors(lats, lons)
+        positions = np.full((len(lats), k), -1)
+        distances = np.full((len(lats), k), np.inf)
+        qi = np.floor(lats / self.bucket).astype(int)
+        qj = np.floor(lons / self.bucket).astype(int)
+        if len(lats) == 1:
+            groups = [((int(qi[0]), int(qj[0])), slice(None))]
+        else:
+            order = np.lexsort((qj, qi))
+            groups = [(key, order[rows]) for key, rows in _group_slices(qi[order], qj[order])]
+
+        for (ci, cj), rows in groups:
+            pos, dist = self._query_bucket(units[rows], ci, cj, k, max_km)
+            if pos is None:
+                continue
+            found = dist <= max_km
+            positions[rows, :pos.shape[1]] = np.where(found, pos, -1)
+            distances[rows, :pos.shape[1]] = np.where(found, dist, np.inf)
+        return positions, distances
+
+
+def _group_slices(bi, bj):
+    """
+    Yields ((bi, bj), slice) for each run of equal keys in sorted key arrays.
+    """
+    if not len(bi):
+        return
+    change = np.flatnonzero((np.diff(bi) != 0) | (np.diff(bj) != 0)) + 1
+    starts = np.r_[0, change]
+    ends = np.r_[change, len(bi)]
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        yield (int(bi[s]), int(bj[s])), slice(s, e)
+
+
+def aqi_from_pollutants(values):
+    """
+    CPCB AQI (max sub-index, rounded) for rows of POLLUTANTS values; NaN where all are missing.
+    """
+    from utils import sub_index
+
+    sub = np.stack([sub_index(values[:, j], p) for j, p in enumerate(POLLUTANTS)], axis=1)
+    valid = ~np.isnan(sub).all(axis=1)
+    aqi = np.full(len(values), np.nan)
+    aqi[valid] = np.round(np.nanmax(sub[valid], axis=1))
+    return aqi
+
+
+class AqiInterpolator:
+    """
+    Estimates pollutant levels anywhere from the latest snapshot by inverse-distance weighting
+    of the k nearest readings, then computes AQI from the estimated pollutants (AQI itself is a
+    max over sub-indices and does not interpolate well). No API calls are made.
+    """
+
+    def __init__(self, df, k=DEFAULT_K, power=DEFAULT_POWER, max_distance_km=MAX_DISTANCE_KM):
+        df = df.dropna(subset=['lat', 'lon'])
+        self.k = k
+        self.power = power
+        self.max_distance_km = max_distance_km
+        self.values = df.reindex(columns=POLLUTANTS).to_numpy(dtype=float)
+        self.index = NeighbourIndex(df['lat'].to_numpy(), df['lon'].to_numpy())
+
+    @classmethod
+    def from_snapshot(cls, path=None, **kwargs):
+        from snapshot import load_snapshot
+
+        return cls(load_snapshot(path, columns=['lat', 'lon'] + POLLUTANTS), **kwargs)
+
+    def _weighted(self, lats, lons):
+        positions, dist = self.index.query(lats, lons, self.k, self.max_distance_km)
+        # Empty slots have infinite distance and so zero weight
+        weights = 1.0 / np.maximum(dist, MIN_DISTANCE_KM) ** self.power
+        neighbour_values = self.values[positions]
+        # Missing pollutants drop out of that column's weighted average
+        missing = np.isnan(neighbour_values)
+        w = np.where(missing, 0.0, weights[:, :, None])
+        total = w.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.einsum("nkp,nkp->np", w, np.where(missing, 0.0, neighbour_values)) / total
+        return values, dist[:, 0]
+
+    def estimate(self, lats, lons):
+        """
+        Returns (pollutant estimates shaped (n, 6), AQI, distance to the nearest reading in km)
+        for arrays of coordinates. Rows with no reading within max_distance_km are NaN.
+        """
+        values, nearest = self._weighted(lats, lons)
+        return values, aqi_from_pollutants(values), nearest
+
+    def point(self, lat, lon):
+        """
+        Estimate for one location as a dict, or None if no reading is within range.
+        Pollutants no neighbour reported are None, so the dict serializes to valid JSON.
+        """
+        from utils import AQI_BREAKPOINTS, CPCB_BREAKPOINTS, UNIT_SCALE, categorize_aqi
+
+        values, nearest = self._weighted([lat], [lon])
+        estimate = dict(zip(POLLUTANTS, values[0].tolist()))
+        # Scalar AQI: six np.interp calls on plain floats beat the array path for one row
+        sub = [float(np.interp(v * UNIT_SCALE.get(p, 1.0), CPCB_BREAKPOINTS[p], AQI_BREAKPOINTS))
+               for p, v in estimate.items() if v >= 0]
+        if not sub:
+            return None
+        aqi = float(round(max(sub)))
+        return {"lat": lat, "lon": lon, **{p: round(v, 2) if math.isfinite(v) else None for p, v in estimate.items()},
+                "aqi": aqi, "aqi_category": str(categorize_aqi(aqi)), "nearest_km": round(float(nearest[0]), 1)}
+
+    def grid(self, step=GRID_STEP, bounds=INDIA_BOUNDS):
+        """
+        Estimates on a regular grid of cell centres over `bounds`. Returns a DataFrame with lat,
+        lon, pollutants, aqi and aqi_category for the cells within range of a reading.
+        """
+        import pandas as pd
+        from utils import categorize_aqi
+
+        lat_min, lat_max, lon_min, lon_max = bounds
+        lats = np.arange(lat_min + step / 2, lat_max, step)
+        lons = np.arange(lon_min + step / 2, lon_max, step)
+        grid_lat, grid_lon = (a.ravel() for a in np.meshgrid(lats, lons, indexing="ij"))
+        values, aqi, _ = self.estimate(grid_lat, grid_lon)
+        keep = ~np.isnan(aqi)
+        df = pd.DataFrame(values[keep].astype(np.float32), columns=POLLUTANTS)
+        df.insert(0, 'lat', grid_lat[keep].round(6))
+        df.insert(1, 'lon', grid_lon[keep].round(6))
+        df['aqi'] = aqi[keep]
+        df['aqi_category'] = categorize_aqi(df['aqi'].to_numpy())
+        return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate AQI at any location from the latest snapshot.")
+    parser.add_argument("--point", nargs=2, type=float, metavar=("LAT", "LON"), help="Estimate one location")
+    parser.add_argument("--grid", metavar="CSV", help="Write a national grid of estimates to this CSV")
+    parser.add_argument("--step", type=float, default=GRID_STEP, help=f"Grid step in degrees (default: {GRID_STEP})")
+    parser.add_argument("--snapshot", default=None, help="Snapshot file (default: the newer of the Parquet and CSV snapshots)")
+    args = parser.parse_args(argv)
+
+    interpolator = AqiInterpolator.from_snapshot(args.snapshot)
+    if args.point:
+        estimate = interpolator.point(*args.point)
+        print(estimate if estimate else f"No reading within {MAX_DISTANCE_KM:.0f} km of {args.point[0]}, {args.point[1]}")
+    if args.grid:
+        started = time.perf_counter()
+        grid = interpolator.grid(args.step)
+        elapsed = time.perf_counter() - started
+        grid.to_csv(args.grid, index=False)
+        print(f"{len(grid)} grid cells of {args.step}° estimated in {elapsed:.2f}s, saved to {args.grid}")
+    if not args.point and not args.grid:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets (seconds), from sub-millisecond parsing up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+ENABLED = not os.getenv("AQI_METRICS_DISABLED")
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with sum and count, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation inside the bucket that holds it.
+        """
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * ((rank - seen) / c)
+            seen += c
+        return self.buckets[-1]
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(key, Histogram())
+    hist.observe(value)
+
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Records the duration of the block (seconds) in the `name` histogram.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, **labels):
+    """
+    Decorator form of timer().
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+    lines, typed = [], set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE aqi_{name} counter")
+            typed.add(name)
+        lines.append(f"aqi_{name}{_label_text(labels)} {value}")
+    for (name, labels), hist in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE aqi_{name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+            cumulative += count
+            lines.append(f"aqi_{name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"aqi_{name}_sum{_label_text(labels)} {hist.sum}")
+        lines.append(f"aqi_{name}_count{_label_text(labels)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """
+    All metrics as a JSON-friendly dict: counters, and per histogram count/sum/mean/p50/p95/p99.
+    """
+    def label_name(name, labels):
+        return name + _label_text(labels)
+
+    with _lock:
+        counters = dict(_counters)
+        histograms = dict(_histograms)
+    return {
+        "counters": {label_name(*k): v for k, v in sorted(counters.items())},
+        "histograms": {
+            label_name(*k): {
+                "count": h.count,
+                "sum": h.sum,
+                "mean": h.sum / h.count if h.count else None,
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95),
+                "p99": h.quantile(0.99),
+            }
+            for k, h in sorted(histograms.items(), key=lambda item: item[0])
+        },
+    }
+
+
+def summary():
+    """
+    Human-readable table of where time went, for the end of a batch run.
+    """
+    data = snapshot()
+    lines = [f"{'stage':<40} {'count':>8} {'total s':>9} {'mean ms':>9} {'p95 ms':>9}"]
+    for name, h in sorted(data["histograms"].items(), key=lambda item: -item[1]["sum"]):
+        p95 = h["p95"] * 1000 if h["p95"] is not None else float("nan")
+        mean = h["mean"] * 1000 if h["mean"] is not None else float("nan")
+        lines.append(f"{name:<40} {h['count']:>8} {h['sum']:>9.2f} {mean:>9.2f} {p95:>9.2f}")
+    if data["counters"]:
+        lines.append("")
+        lines += [f"{name:<40} {value:>8}" for name, value in data["counters"].items()]
+    return "\n".join(lines)
+
+
+def serve_metrics(port, host="127.0.0.1", views=None):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json on a background thread, plus any
+    `views` ({path: callable returning a JSON-friendly value}).
+    Returns the server; call shutdown() to stop it.
+    """
+    views = dict(views or {})
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(snapshot()).encode(), "application/json"
+            elif self.path in views:
+                body, content_type = json.dumps(views[self.path](), default=str).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler: a background thread snapshots every thread's stack each
+    `interval` seconds and counts collapsed stacks (flamegraph.pl / speedscope format).
+    """
+
+    def __init__(self, interval=0.005, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="aqi-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def top_functions(self, n=15):
+        """
+        Functions by share of samples in which they were the innermost frame.
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(name, count / total) for name, count in leaves.most_common(n)]
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
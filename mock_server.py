@@ -0,0 +1,163 @@
+import argparse
+import gzip
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from rate_limiter import TokenBucket
+
+HISTORY_PATH = "/data/2.5/air_pollution/history"
+
+
+def synthetic_components(lat, lon, dt):
+    """
+    Deterministic, plausible pollutant values for a location and hour (diurnal cycle + per-location level).
+    """
+    base = 40 + (abs(math.sin(lat * 12.9898 + lon * 78.233)) * 160)
+    daily = 1 + 0.35 * math.sin(2 * math.pi * ((dt // 3600) % 24) / 24)
+    pm25 = base * daily
+    return {
+        "co": round(pm25 * 9.5, 2),
+        "no": round(pm25 * 0.05, 2),
+        "no2": round(pm25 * 0.3, 2),
+        "o3": round(60 + 40 * math.cos(2 * math.pi * ((dt // 3600) % 24) / 24), 2),
+        "so2": round(pm25 * 0.12, 2),
+        "pm2_5": round(pm25, 2),
+        "pm10": round(pm25 * 1.3, 2),
+        "nh3": round(pm25 * 0.04, 2),
+    }
+
+
+def history_payload(lat, lon, start, end):
+    first = start - start % 3600 + (3600 if start % 3600 else 0)
+    return {
+        "coord": {"lon": lon, "lat": lat},
+        "list": [
+            {"main": {"aqi": 3}, "components": synthetic_components(lat, lon, dt), "dt": dt}
+            for dt in range(first, end + 1, 3600)
+        ],
+    }
+
+
+class MockState:
+    """
+    Behaviour knobs shared by all request handlers, plus request counters.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, capacity=max(1, rate_limit // 60)) if rate_limit else None
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Keep-alive responses are written in two sends; without this, Nagle + delayed ACK adds ~40 ms each
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state = self.state
+        state.count("requests")
+        url = urlparse(self.path)
+        if url.path != HISTORY_PATH:
+            self._send(404, {"cod": "404", "message": "Internal error"})
+            return
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not params.get("appid"):
+            self._send(401, {"cod": 401, "message": "Invalid API key."})
+            return
+
+        if state.bucket is not None and not state.bucket.try_acquire():
+            state.count("rate_limited")
+            self._send(429, {"cod": 429, "message": "Too many requests"}, {"Retry-After": "1"})
+            return
+
+        with state.lock:
+            delay = max(0.0, state.latency_ms + state.random.uniform(-state.jitter_ms, state.jitter_ms))
+            fail = state.random.random() < state.error_rate
+        if delay:
+            time.sleep(delay / 1000.0)
+
+        if fail:
+            state.count("errors")
+            self._send(500, {"cod": "500", "message": "Internal error"})
+            return
+
+        try:
+            lat, lon = float(params["lat"]), float(params["lon"])
+            start, end = int(params["start"]), int(params["end"])
+        except (KeyError, ValueError):
+            self._send(400, {"cod": "400", "message": "bad request"})
+            return
+
+        state.count("ok")
+        self._send(200, history_payload(lat, lon, start, end))
+
+
+def start_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    Starts the mock server on a background thread. Returns (server, base_url, state).
+    Call server.shutdown() to stop it.
+    """
+    state = MockState(**options)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenWeather air pollution history API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=50.0, help="Mean response latency in ms")
+    parser.add_argument("--jitter", type=float, default=20.0, help="Uniform latency jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Calls per minute before answering 429")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_mock_server(
+        args.host, args.port, latency_ms=args.latency, jitter_ms=args.jitter,
+        error_rate=args.error_rate, rate_limit=args.rate_limit,
+    )
+    print(f"Mock OpenWeather API on {base_url} (set OPENWEATHER_BASE_URL={base_url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
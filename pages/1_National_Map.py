@@ -0,0 +1,169 @@
+import math
+import os
+import numpy as np
+import streamlit as st
+import plotly.express as px
+
+# Local modules
+from city_loader import get_all_cities, get_coords
+from grid import bin_points
+from interpolate import AqiInterpolator, INDIA_BOUNDS, MAX_DISTANCE_KM
+from snapshot import latest_snapshot_path, load_snapshot
+from utils import AQI_CATEGORIES, add_aqi_columns, categorize_aqi, get_aqi_color
+
+# Above this many cities in view the map shows grid cells instead of individual markers
+MAX_POINTS = 1500
+# Cell sizes (degrees) to pick from when binning; roughly 40 cells across the view
+CELL_SIZES = [0.1, 0.25, 0.5, 1.0, 2.0]
+INDIA_CENTER = {"lat": 22.5, "lon": 80.0}
+INDIA_ZOOM = 3.6
+
+CATEGORY_COLORS = {c: get_aqi_color(c) for c in AQI_CATEGORIES + ["Unknown"]}
+
+st.set_page_config(
+    page_title="AQI Monitor - National Map",
+    page_icon="🌫️",
+    layout="wide",
+)
+
+st.markdown("""
+<style>
+    .stApp {
+        background-color: #0E1117;
+        color: #FAFAFA;
+    }
+    .stAppDeployButton {display:none;}
+    [data-testid="stToolbar"] {visibility: hidden !important;}
+    footer {visibility: hidden !important;}
+    [data-testid="stSidebar"] {
+        background-color: #021a1a;
+        border-right: 1px solid #1E2D2D;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+
+@st.cache_data(show_spinner=False)
+def load_map_points(path, mtime):
+    # Loaded once per snapshot (mtime is part of the cache key); only what the map needs is kept
+    df = load_snapshot(path)
+    if 'aqi' not in df.columns:
+        # Snapshots written before AQI was stored
+        df = add_aqi_columns(df)
+    df = df[['city', 'lat', 'lon', 'pm2_5', 'aqi']].dropna(subset=['lat', 'lon'])
+    df['aqi_category'] = categorize_aqi(df['aqi'].to_numpy())
+    return df.reset_index(drop=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_interpolator(path, mtime):
+    # One neighbour index per snapshot, shared by all sessions
+    return AqiInterpolator.from_snapshot(path)
+
+
+def view_bounds(lat, lon, radius_km):
+    """
+    Returns (lat_min, lat_max, lon_min, lon_max) of a box `radius_km` around a point.
+    """
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.0 * max(0.1, math.cos(math.radians(lat))))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def pick_cell_size(lat_span, lon_span):
+    target = max(lat_span, lon_span) / 40
+    return next((size for size in CELL_SIZES if size >= target), CELL_SIZES[-1])
+
+
+st.markdown("## National AQI Map 🇮🇳")
+
+snapshot_path = latest_snapshot_path()
+if not os.path.exists(snapshot_path):
+    st.info("No snapshot yet. Run `python app.py` to generate one.")
+    st.stop()
+
+points = load_map_points(snapshot_path, os.path.getmtime(snapshot_path))
+
+# --- View controls ---
+st.sidebar.title("Map View")
+focus = st.sidebar.selectbox("Focus", ["All India"] + get_all_cities())
+radius_km = st.sidebar.slider("Radius (km)", 25, 1000, 250, step=25, disabled=focus == "All India")
+detail = st.sidebar.radio("Detail", ["Auto", "Cities", "Grid", "Estimated"], horizontal=True,
+                          help="Estimated fills a grid by interpolating the nearest readings")
+
+center, zoom = INDIA_CENTER, INDIA_ZOOM
+in_view = points
+bounds = INDIA_BOUNDS
+if focus != "All India":
+    f_lat, f_lon = get_coords(focus)
+    if f_lat is not None:
+        bounds = lat_min, lat_max, lon_min, lon_max = view_bounds(f_lat, f_lon, radius_km)
+        lats, lons = points['lat'].to_numpy(), points['lon'].to_numpy()
+        mask = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+        in_view = points[mask]
+        center = {"lat": f_lat, "lon": f_lon}
+        zoom = max(INDIA_ZOOM, min(11.0, math.log2(20000.0 / radius_km)))
+
+use_grid = detail == "Grid" or (detail == "Auto" and len(in_view) > MAX_POINTS)
+
+# --- Map ---
+if in_view.empty and detail != "Estimated":
+    st.info("No cities in this view.")
+    st.stop()
+
+if detail == "Estimated":
+    cell_size = pick_cell_size(bounds[1] - bounds[0], bounds[3] - bounds[2])
+    cells = load_interpolator(snapshot_path, os.path.getmtime(snapshot_path)).grid(cell_size, bounds)
+    if cells.empty:
+        st.info(f"No readings within {MAX_DISTANCE_KM:.0f} km of this view.")
+        st.stop()
+    fig = px.scatter_map(
+        cells, lat='lat', lon='lon',
+        color='aqi_category',
+        color_discrete_map=CATEGORY_COLORS,
+        category_orders={'aqi_category': list(CATEGORY_COLORS)},
+        hover_data={'aqi': ':.0f', 'pm2_5': ':.1f', 'lat': ':.2f', 'lon': ':.2f'},
+        labels={'aqi': 'Est. AQI', 'pm2_5': 'Est. PM2.5', 'aqi_category': 'Category'},
+        center=center, zoom=zoom, map_style="carto-darkmatter",
+    )
+    fig.update_traces(marker={'size': 9, 'opacity': 0.7})
+    caption = f"{len(cells)} estimated cells of {cell_size}°, interpolated from the nearest readings"
+elif use_grid:
+    # Aggregated server-side so the browser only receives one marker per cell
+    lat_span = float(np.ptp(in_view['lat'].to_numpy()))
+    lon_span = float(np.ptp(in_view['lon'].to_numpy()))
+    cell_size = pick_cell_size(lat_span, lon_span)
+    cells = bin_points(in_view, cell_size)
+    cells['aqi_category'] = categorize_aqi(cells['mean'].to_numpy())
+    cells['mean'] = cells['mean'].round()
+    fig = px.scatter_map(
+        cells, lat='cell_lat', lon='cell_lon',
+        color='aqi_category', size='count', size_max=18,
+        color_discrete_map=CATEGORY_COLORS,
+        category_orders={'aqi_category': list(CATEGORY_COLORS)},
+        hover_data={'count': True, 'mean': True, 'max': True, 'cell_lat': False, 'cell_lon': False},
+        labels={'count': 'Cities', 'mean': 'Mean AQI', 'max': 'Max AQI', 'aqi_category': 'Category'},
+        center=center, zoom=zoom, map_style="carto-darkmatter",
+    )
+    caption = f"{len(in_view)} cities in {len(cells)} grid cells of {cell_size}°"
+else:
+    fig = px.scatter_map(
+        in_view, lat='lat', lon='lon',
+        color='aqi_category', hover_name='city',
+        color_discrete_map=CATEGORY_COLORS,
+        category_orders={'aqi_category': list(CATEGORY_COLORS)},
+        hover_data={'aqi': ':.0f', 'pm2_5': ':.1f', 'lat': False, 'lon': False},
+        labels={'aqi': 'AQI', 'pm2_5': 'PM2.5', 'aqi_category': 'Category'},
+        center=center, zoom=zoom, map_style="carto-darkmatter",
+    )
+    fig.update_traces(marker={'size': 7})
+    caption = f"{len(in_view)} cities"
+
+fig.update_layout(
+    paper_bgcolor="rgba(0,0,0,0)",
+    margin=dict(l=0, r=0, t=0, b=0),
+    height=650,
+    legend=dict(orientation="h", yanchor="bottom", y=1.01, xanchor="right", x=1, font=dict(color="white")),
+)
+st.plotly_chart(fig, use_container_width=True)
+st.caption(f"{caption} from {snapshot_path}")
@@ -0,0 +1,185 @@
+import heapq
+import math
+import threading
+from collections import Counter
+from batch_writer import record_key
+
+# Columns kept for each leaderboard entry
+ENTRY_COLUMNS = ['city', 'lat', 'lon', 'pm2_5', 'aqi', 'aqi_category']
+
+
+def _plain(value):
+    # numpy scalars -> Python values, so snapshots stay JSON-serializable
+    return value.item() if hasattr(value, "item") else value
+
+
+class Leaderboard:
+    """
+    Streaming top-K and bottom-K by one column. Two bounded heaps hold K rows each, so the
+    rankings are ready at any point of a run without keeping the results in memory.
+    A city added again (e.g. re-written after a resume) is only ranked once.
+    """
+
+    def __init__(self, n=10, column="pm2_5"):
+        self.n = n
+        self.column = column
+        # Min-heaps of (score, seq, key, row); the bottom heap scores by -value
+        self._top, self._bottom = [], []
+        self._top_keys, self._bottom_keys = set(), set()
+        self._seq = 0
+
+    def _push(self, heap, keys, score, key, row):
+        if key in keys:
+            return
+        entry = (score, self._seq, key, row)
+        self._seq += 1
+        if len(heap) < self.n:
+            heapq.heappush(heap, entry)
+            keys.add(key)
+        elif score > heap[0][0]:
+            # Ties keep the row seen first
+            keys.discard(heapq.heapreplace(heap, entry)[2])
+            keys.add(key)
+
+    def add(self, row):
+        value = row.get(self.column)
+        if value is None or math.isnan(value):
+            return
+        key = record_key(row['city'], row['lat'], row['lon'])
+        self._push(self._top, self._top_keys, value, key, row)
+        self._push(self._bottom, self._bottom_keys, -value, key, row)
+
+    def top(self):
+        """
+        Highest rows first.
+        """
+        return [e[3] for e in sorted(self._top, key=lambda e: (-e[0], e[1]))]
+
+    def bottom(self):
+        """
+        Lowest rows first.
+        """
+        return [e[3] for e in sorted(self._bottom, key=lambda e: (-e[0], e[1]))]
+
+
+class RegionStats:
+    """
+    Per-region running aggregates: city count, mean and max of a column (with the city at the
+    max) and city counts per AQI category. Regions come from a RegionLookup of each city's
+    coordinates.
+    """
+
+    def __init__(self, lookup=None, column="aqi"):
+        if lookup is None:
+            from regions import RegionLookup
+            lookup = RegionLookup()
+        self.lookup = lookup
+        self.column = column
+        self._stats = {}
+
+    def update(self, df):
+        regions = self.lookup.lookup(df['lat'], df['lon'])
+        values = df[self.column].to_numpy(dtype=float)
+        categories = df['aqi_category'].astype(str) if 'aqi_category' in df.columns else ["Unknown"] * len(df)
+        for region, value, category, city in zip(regions, values, categories, df['city']):
+            stats = self._stats.get(region)
+            if stats is None:
+                stats = self._stats[region] = {"cities": 0, "sum": 0.0, "count": 0, "max": None,
+                                               "worst_city": None, "categories": Counter()}
+            stats["cities"] += 1
+            stats["categories"][category] += 1
+            if math.isnan(value):
+                continue
+            stats["sum"] += value
+            stats["count"] += 1
+            if stats["max"] is None or value > stats["max"]:
+                stats["max"], stats["worst_city"] = value, city
+
+    def rows(self):
+        """
+        One dict per region, highest mean first.
+        """
+        rows = [
+            {"region": region, "cities": s["cities"], "mean": s["sum"] / s["count"] if s["count"] else None,
+             "max": s["max"], "worst_city": s["worst_city"], "categories": dict(s["categories"])}
+            for region, s in self._stats.items()
+        ]
+        return sorted(rows, key=lambda r: -r["mean"] if r["mean"] is not None else math.inf)
+
+    def table(self):
+        """
+        Regions as a DataFrame with one column per AQI category present.
+        """
+        import pandas as pd
+        from utils import AQI_CATEGORIES
+
+        rows = self.rows()
+        df = pd.DataFrame([{k: v for k, v in r.items() if k != "categories"} for r in rows],
+                          columns=["region", "cities", "mean", "max", "worst_city"])
+        for category in AQI_CATEGORIES + ["Unknown"]:
+            counts = [r["categories"].get(category, 0) for r in rows]
+            if any(counts):
+                df[category] = counts
+        return df
+
+
+class RunRankings:
+    """
+    Leaderboards and regional aggregates fed with each batch of results as it is written,
+    safe to read from another thread (e.g. the live metrics server) mid-run.
+    """
+
+    def __init__(self, n=10, column="pm2_5", region_lookup=None):
+        self.leaderboard = Leaderboard(n, column)
+        self.regions = RegionStats(region_lookup)
+        self.seen = 0
+        self._lock = threading.Lock()
+
+    def update(self, df):
+        """
+        Adds a batch of output rows (city, lat, lon, pollutants, aqi, aqi_category).
+        """
+        n = self.leaderboard.n
+        column = self.leaderboard.column
+        columns = [c for c in ENTRY_COLUMNS if c in df.columns]
+        # Only a batch's own top / bottom K can enter the heaps
+        candidates = df.nlargest(n, column).to_dict("records") + df.nsmallest(n, column).to_dict("records")
+        with self._lock:
+            for row in candidates:
+                self.leaderboard.add({c: _plain(row[c]) for c in columns})
+            self.regions.update(df)
+            self.seen += len(df)
+
+    def seed_from_file(self, path, keys, chunksize=1000):
+        """
+        Adds rows already in an output file, for a resumed run. Only rows whose record key is in
+        `keys` (the cities the checkpoint lists as done) are counted, once each.
+        """
+        import os
+        import pandas as pd
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        counted = set()
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            keep = []
+            for row in chunk[['city', 'lat', 'lon']].itertuples(index=False, name=None):
+                key = record_key(*row)
+                keep.append(key in keys and key not in counted)
+                counted.add(key)
+            chunk = chunk[keep]
+            if len(chunk):
+                self.update(chunk)
+
+    def snapshot(self):
+        """
+        Current rankings as a JSON-friendly dict.
+        """
+        with self._lock:
+            return {
+                "cities": self.seen,
+                "column": self.leaderboard.column,
+                "top": self.leaderboard.top(),
+                "bottom": self.leaderboard.bottom(),
+                "regions": self.regions.rows(),
+            }
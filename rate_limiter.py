@@ -0,0 +1,50 @@
+import threading
+import time
+
+# OpenWeather free tier allows 60 calls per minute
+DEFAULT_CALLS_PER_MINUTE = 60
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to stay under the provider's calls-per-minute quota.
+    Holds up to `capacity` tokens and refills at `calls_per_minute / 60` tokens per second.
+    """
+
+    def __init__(self, calls_per_minute=DEFAULT_CALLS_PER_MINUTE, capacity=None):
+        if calls_per_minute <= 0:
+            raise ValueError("calls_per_minute must be positive")
+        self.rate = calls_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else max(1, calls_per_minute // 10))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes tokens if available right now. Returns True on success.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until `tokens` are available, then takes them.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import time
+import zlib
+from collections import OrderedDict
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qsl
+
+from interpolate import AqiInterpolator, MAX_DISTANCE_KM
+from snapshot import FLOAT_COLUMNS, latest_snapshot_path
+
+# Upper bounds on list responses
+MAX_TOP_N = 500
+MAX_BBOX_RESULTS = 5000
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 512
+# Encoded responses kept per snapshot version
+RESPONSE_CACHE_SIZE = 2048
+ROW_FIELDS = ["city", "lat", "lon", "timestamp", "pm2_5", "pm10", "no2", "o3", "so2", "co", "aqi", "aqi_category"]
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def snapshot_version(path):
+    """
+    Identifies a snapshot file's content by size and mtime, or None if it is missing.
+    Batch runs and the scheduler swap finished files in, so the file is never half-written.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def _json_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class SnapshotIndex:
+    """
+    Immutable in-memory view of one snapshot: rows pre-encoded as JSON, a name index, an
+    AQI ordering for top-N and coordinate arrays for bounding-box queries.
+    """
+
+    def __init__(self, df, version, path):
+        import numpy as np
+
+        if 'aqi' not in df.columns:
+            # Snapshots written before AQI was stored
+            from utils import add_aqi_columns
+            df = add_aqi_columns(df).drop(columns=['dominant_pollutant'])
+        df = df[[c for c in ROW_FIELDS if c in df.columns]].reset_index(drop=True)
+        if 'timestamp' in df.columns:
+            df['timestamp'] = df['timestamp'].astype(str)
+        # Snapshot pollutants are float32; round so JSON shows 149.9, not 149.89999389648438
+        for col in FLOAT_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype(float).round(0 if col == 'aqi' else 2)
+
+        self.version = version
+        self.path = path
+        self.loaded_at = time.time()
+        self.rows = [
+            json.dumps({k: _json_value(v) for k, v in zip(df.columns, values)}, separators=(",", ":")).encode()
+            for values in df.astype(object).itertuples(index=False, name=None)
+        ]
+        self.by_name = {}
+        for i, name in enumerate(df['city'].astype(str).str.lower()):
+            self.by_name.setdefault(name, []).append(i)
+
+        self.lats = df['lat'].to_numpy(dtype=float)
+        self.lons = df['lon'].to_numpy(dtype=float)
+        aqi = df['aqi'].to_numpy(dtype=float)
+        ranked = np.flatnonzero(~np.isnan(aqi))
+        # Descending by AQI; ties keep snapshot order
+        self.by_aqi = ranked[np.argsort(-aqi[ranked], kind="stable")]
+        # Built here, off the event loop, like the rest of the index
+        self.interpolator = AqiInterpolator(df)
+
+    @classmethod
+    def load(cls, path):
+        from snapshot import load_snapshot
+
+        version = snapshot_version(path)
+        if version is None:
+            return None
+        return cls(load_snapshot(path), version, path)
+
+    def latest(self, city):
+        positions = self.by_name.get(city.strip().lower())
+        if not positions:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"unknown city: {city}")
+        return [self.rows[i] for i in positions]
+
+    def top(self, n, ascending=False):
+        order = self.by_aqi[::-1] if ascending else self.by_aqi
+        return [self.rows[i] for i in order[:n]]
+
+    def estimate(self, lat, lon):
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "lat/lon out of range")
+        estimate = self.interpolator.point(lat, lon)
+        if estimate is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"no reading within {MAX_DISTANCE_KM:.0f} km")
+        return json.dumps(estimate, separators=(",", ":")).encode()
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        import numpy as np
+
+        mask = (self.lats >= min_lat) & (self.lats <= max_lat) & (self.lons >= min_lon) & (self.lons <= max_lon)
+        return [self.rows[i] for i in np.flatnonzero(mask)[:MAX_BBOX_RESULTS]]
+
+
+def _float_param(params, name):
+    try:
+        return float(params[name])
+    except KeyError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"missing parameter: {name}")
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"invalid number for {name}")
+
+
+def _list_body(index, rows, **extra):
+    head = json.dumps({"version": index.version, **extra, "count": len(rows)}, separators=(",", ":")).encode()
+    return head[:-1] + b',"results":[' + b",".join(rows) + b"]}"
+
+
+def handle_query(index, path, params):
+    """
+    Answers one API query against a snapshot. Returns the JSON body as bytes.
+    """
+    if path == "/health":
+        return json.dumps({"version": index.version, "path": index.path, "rows": len(index.rows),
+                           "loaded_at": index.loaded_at}).encode()
+    if path == "/latest":
+        city = params.get("city")
+        if not city:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "missing parameter: city")
+        return _list_body(index, index.latest(city), city=city)
+    if path == "/top":
+        try:
+            n = min(MAX_TOP_N, max(1, int(params.get("n", 10))))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "invalid number for n")
+        ascending = params.get("order", "desc") == "asc"
+        return _list_body(index, index.top(n, ascending), order="asc" if ascending else "desc")
+    if path == "/estimate":
+        # Any location, interpolated from nearby readings
+        estimate = index.estimate(_float_param(params, "lat"), _float_param(params, "lon"))
+        return b'{"version":' + json.dumps(index.version).encode() + b',"estimate":' + estimate + b"}"
+    if path == "/bbox":
+        box = [_float_param(params, name) for name in ("min_lat", "min_lon", "max_lat", "max_lon")]
+        return _list_body(index, index.bbox(*box))
+    raise ApiError(HTTPStatus.NOT_FOUND, f"unknown endpoint: {path}")
+
+
+class ReadApi:
+    """
+    Serves queries from the current SnapshotIndex. A new snapshot is loaded off the event loop
+    and swapped in with a single reference assignment, so in-flight requests finish on the
+    version they started with.
+    """
+
+    def __init__(self, path=None, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.index = None
+        self._cache = OrderedDict()
+
+    def current_path(self):
+        return self.path or latest_snapshot_path()
+
+    async def reload_if_changed(self):
+        path = self.current_path()
+        version = snapshot_version(path)
+        if version is None or (self.index is not None and self.index.version == version and self.index.path == path):
+            return False
+        index = await asyncio.get_running_loop().run_in_executor(None, SnapshotIndex.load, path)
+        if index is None:
+            return False
+        self.index, self._cache = index, OrderedDict()
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                # Keep serving the previous snapshot
+                print(f"Snapshot reload failed: {e}")
+
+    def respond(self, target, headers):
+        """
+        Returns (status, extra headers, body) for a GET target.
+        """
+        index = self.index
+        if index is None:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {}, b'{"error":"no snapshot loaded"}'
+
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        gzip_ok = "gzip" in headers.get("accept-encoding", "")
+        # Responses are a pure function of the snapshot version, the query and the content coding
+        etag = f'"{index.version}-{zlib.crc32(target.encode()):08x}{"-gz" if gzip_ok else ""}"'
+        if etag in headers.get("if-none-match", ""):
+            return HTTPStatus.NOT_MODIFIED, {"ETag": etag, "Vary": "Accept-Encoding"}, b""
+
+        key = (target, gzip_ok)
+        cached = self._cache.get(key)
+        if cached is None:
+            try:
+                body = handle_query(index, url.path, params)
+            except ApiError as e:
+                return e.status, {}, json.dumps({"error": str(e)}).encode()
+            except Exception as e:
+                print(f"Error serving {target}: {e!r}")
+                return HTTPStatus.INTERNAL_SERVER_ERROR, {}, b'{"error":"internal error"}'
+            extra = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            if gzip_ok and len(body) >= GZIP_MIN_BYTES:
+                body = gzip.compress(body, compresslevel=5)
+                extra["Content-Encoding"] = "gzip"
+            self._cache[key] = cached = (extra, body)
+            if len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return HTTPStatus.OK, cached[0], cached[1]
+
+    async def handle_connection(self, reader, writer):
+        # Minimal HTTP/1.1: GET only, keep-alive unless the client asks to close
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    length = -1
+                if length > 0:
+                    try:
+                        await reader.readexactly(length)
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+
+                if length < 0:
+                    # The body cannot be skipped, so the connection cannot be reused
+                    status, extra, body = HTTPStatus.BAD_REQUEST, {}, b'{"error":"invalid Content-Length"}'
+                    headers["connection"] = "close"
+                elif method not in ("GET", "HEAD"):
+                    status, extra, body = HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "GET, HEAD"}, b""
+                else:
+                    status, extra, body = self.respond(target, headers)
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                out = [f"HTTP/1.1 {status.value} {status.phrase}"]
+                if status != HTTPStatus.NOT_MODIFIED:
+                    out.append("Content-Type: application/json")
+                    out.append(f"Content-Length: {len(body)}")
+                out += [f"{k}: {v}" for k, v in extra.items()]
+                if not keep_alive:
+                    out.append("Connection: close")
+                writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1"))
+                if method == "GET" and status != HTTPStatus.NOT_MODIFIED:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8080, path=None, reload_interval=5.0, ready=None):
+    api = ReadApi(path, reload_interval)
+    await api.reload_if_changed()
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    watcher = asyncio.create_task(api.watch())
+    if ready is not None:
+        ready(server, api)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local read API for the latest batch snapshot.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--snapshot", default=None, help="Snapshot file (default: the newer of the Parquet and CSV snapshots)")
+    parser.add_argument("--reload-interval", type=float, default=5.0, help="Seconds between snapshot change checks")
+    args = parser.parse_args()
+
+    def ready(server, api):
+        rows = len(api.index.rows) if api.index else 0
+        print(f"Serving {rows} cities from {api.current_path()} on http://{args.host}:{server.sockets[0].getsockname()[1]}")
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.snapshot, args.reload_interval, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from history_store import fetch_history, get_default_store, location_key
+
+# Seconds between background refreshes of the hot set
+DEFAULT_INTERVAL = int(os.getenv("AQI_REFRESH_INTERVAL", "300"))
+# How many of the most-viewed locations are kept fresh (pinned ones come on top)
+DEFAULT_MAX_HOT = 20
+# Locations held in memory at most; the least viewed are dropped first
+DEFAULT_MAX_ENTRIES = 200
+
+
+class HistoryRefresher:
+    """
+    Process-wide, in-memory snapshot of hourly history shared by all dashboard sessions.
+    A background thread keeps pinned and most-viewed locations fresh, so sessions reading them
+    never wait on the network. Concurrent misses for the same location share one in-flight fetch.
+    Frames handed out are shared between sessions and must not be modified in place.
+    """
+
+    def __init__(self, past_days=30, interval=DEFAULT_INTERVAL, max_hot=DEFAULT_MAX_HOT,
+                 max_entries=DEFAULT_MAX_ENTRIES, workers=8, store=None):
+        self.past_days = past_days
+        self.interval = interval
+        self.max_hot = max_hot
+        self.max_entries = max_entries
+        self.store = store if store is not None else get_default_store()
+        self._snapshot = {}
+        self._coords = {}
+        self._inflight = {}
+        self._views = Counter()
+        # Views not yet written to the store's demand table
+        self._unsaved_views = Counter()
+        self._pinned = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="aqi-refresh")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="aqi-refresher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def pin(self, lat, lon):
+        key = location_key(lat, lon)
+        with self._lock:
+            self._coords[key] = (lat, lon)
+            if key not in self._pinned:
+                self._pinned.append(key)
+        self._pool.submit(self._fetch, key, lat, lon, time.time())
+
+    def get(self, lat, lon):
+        return self.get_many([(lat, lon)])[0]
+
+    def get_many(self, locations):
+        """
+        Returns frames for several (lat, lon) locations, in order. Snapshot hits return at once;
+        stale hits are returned as-is and refreshed in the background; only locations never
+        fetched before are waited for, concurrently.
+        """
+        now = time.time()
+        keys = [location_key(lat, lon) for lat, lon in locations]
+        frames, misses = [None] * len(keys), []
+        with self._lock:
+            for i, (key, (lat, lon)) in enumerate(zip(keys, locations)):
+                self._views[key] += 1
+                self._unsaved_views[key] += 1
+                self._coords[key] = (lat, lon)
+                entry = self._snapshot.get(key)
+                if entry is None:
+                    misses.append(i)
+                    continue
+                frames[i] = entry[0]
+                if now - entry[1] > self.interval:
+                    self._pool.submit(self._fetch, key, lat, lon, now)
+
+        pending = [(i, self._pool.submit(self._fetch, keys[i], *locations[i], now)) for i in misses]
+        for i, future in pending:
+            frames[i] = future.result()
+        return frames
+
+    def refresh_hot(self):
+        """
+        Refreshes pinned locations and the most viewed ones, then decays view counts so the
+        hot set follows what is being looked at now. Views since the last cycle are saved to
+        the store, where the refresh scheduler reads them as demand.
+        """
+        with self._lock:
+            hot = list(self._pinned)
+            hot += [k for k, _ in self._views.most_common(self.max_hot) if k not in hot]
+            self._views = Counter({k: v // 2 for k, v in self._views.items() if v // 2})
+            unsaved, self._unsaved_views = self._unsaved_views, Counter()
+            coords = [(k, self._coords[k]) for k in hot]
+        self.store.record_views(dict(unsaved))
+        now = time.time()
+        for future in [self._pool.submit(self._fetch, key, lat, lon, now) for key, (lat, lon) in coords]:
+            future.exception()
+
+    def _fetch(self, key, lat, lon, requested):
+        # The first caller for a key does the work; everyone else waits on its future.
+        # A fetch that finished after the caller asked already answers it.
+        with self._lock:
+            entry = self._snapshot.get(key)
+            if entry is not None and entry[1] >= requested:
+                return entry[0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            df = fetch_history(lat, lon, past_days=self.past_days, store=self.store)
+            with self._lock:
+                self._snapshot[key] = (df, time.time())
+                self._evict()
+            future.set_result(df)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def _evict(self):
+        if len(self._snapshot) <= self.max_entries:
+            return
+        keep = set(self._pinned)
+        for key in sorted(self._snapshot, key=lambda k: self._views.get(k, 0)):
+            if len(self._snapshot) <= self.max_entries:
+                break
+            if key not in keep:
+                del self._snapshot[key]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_hot()
+            except Exception:
+                # Keep serving the last snapshot; the next cycle retries
+                pass
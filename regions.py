@@ -0,0 +1,91 @@
+import numpy as np
+
+# Reference points for assigning a city to a state / union territory by its nearest point:
+# state centroids plus capitals and large cities near borders, where the nearest centroid
+# would belong to a neighbour. Approximate at borders; pass a finer list (e.g. district
+# headquarters) to RegionLookup.from_csv for district-level or exact regions.
+REGION_POINTS = [
+    ("Andhra Pradesh", 15.9, 79.7), ("Andhra Pradesh", 17.69, 83.22), ("Andhra Pradesh", 16.51, 80.65),
+    ("Andhra Pradesh", 14.44, 79.99), ("Andhra Pradesh", 13.63, 79.42),
+    ("Arunachal Pradesh", 28.2, 94.7), ("Arunachal Pradesh", 27.08, 93.61),
+    ("Assam", 26.2, 92.9), ("Assam", 26.14, 91.74), ("Assam", 27.47, 94.91), ("Assam", 24.83, 92.78),
+    ("Assam", 26.17, 90.62),
+    ("Bihar", 25.6, 85.1), ("Bihar", 25.1, 85.3), ("Bihar", 26.12, 85.39), ("Bihar", 24.8, 84.98), ("Bihar", 25.78, 84.73),
+    ("Chhattisgarh", 21.3, 81.9), ("Chhattisgarh", 21.25, 81.63), ("Chhattisgarh", 22.08, 82.15),
+    ("Goa", 15.4, 74.0),
+    ("Gujarat", 22.3, 71.2), ("Gujarat", 23.02, 72.57), ("Gujarat", 21.17, 72.83), ("Gujarat", 22.31, 73.18),
+    ("Gujarat", 22.3, 70.8), ("Gujarat", 23.24, 69.67),
+    ("Haryana", 29.1, 76.1), ("Haryana", 28.46, 77.03), ("Haryana", 28.41, 77.32), ("Haryana", 29.39, 76.97),
+    ("Himachal Pradesh", 31.9, 77.1), ("Himachal Pradesh", 31.1, 77.17), ("Himachal Pradesh", 32.22, 76.32),
+    ("Jharkhand", 23.6, 85.3), ("Jharkhand", 23.34, 85.31), ("Jharkhand", 22.8, 86.18), ("Jharkhand", 23.8, 86.43),
+    ("Jharkhand", 24.03, 84.07),
+    ("Karnataka", 15.3, 75.7), ("Karnataka", 12.97, 77.59), ("Karnataka", 12.3, 76.64), ("Karnataka", 15.85, 74.5),
+    ("Karnataka", 12.91, 74.86), ("Karnataka", 17.33, 76.83),
+    ("Kerala", 10.5, 76.3), ("Kerala", 8.52, 76.94), ("Kerala", 9.93, 76.27), ("Kerala", 11.26, 75.78),
+    ("Madhya Pradesh", 23.5, 78.6), ("Madhya Pradesh", 23.26, 77.41), ("Madhya Pradesh", 22.72, 75.86),
+    ("Madhya Pradesh", 26.22, 78.18), ("Madhya Pradesh", 23.18, 79.99),
+    ("Maharashtra", 19.6, 75.6), ("Maharashtra", 19.08, 72.88), ("Maharashtra", 18.52, 73.86),
+    ("Maharashtra", 21.15, 79.09), ("Maharashtra", 20.0, 73.79), ("Maharashtra", 19.88, 75.34),
+    ("Maharashtra", 16.7, 74.24),
+    ("Manipur", 24.7, 93.9),
+    ("Meghalaya", 25.5, 91.3), ("Meghalaya", 25.57, 91.88),
+    ("Mizoram", 23.3, 92.8),
+    ("Nagaland", 26.1, 94.5), ("Nagaland", 25.67, 94.11),
+    ("Odisha", 20.5, 84.6), ("Odisha", 20.3, 85.82), ("Odisha", 22.26, 84.85), ("Odisha", 19.31, 84.79),
+    ("Punjab", 30.8, 75.5), ("Punjab", 31.63, 74.87), ("Punjab", 30.9, 75.85), ("Punjab", 30.21, 74.95),
+    ("Rajasthan", 26.6, 73.8), ("Rajasthan", 26.91, 75.79), ("Rajasthan", 26.24, 73.02), ("Rajasthan", 25.18, 75.83),
+    ("Rajasthan", 24.59, 73.71), ("Rajasthan", 28.02, 73.31), ("Rajasthan", 27.55, 76.6),
+    ("Sikkim", 27.5, 88.5), ("Sikkim", 27.33, 88.61),
+    ("Tamil Nadu", 11.1, 78.7), ("Tamil Nadu", 13.08, 80.27), ("Tamil Nadu", 11.02, 76.96), ("Tamil Nadu", 9.93, 78.12),
+    ("Tamil Nadu", 12.92, 79.13), ("Tamil Nadu", 8.73, 77.7),
+    ("Telangana", 18.1, 79.0), ("Telangana", 17.39, 78.49), ("Telangana", 17.97, 79.6),
+    ("Tripura", 23.7, 91.7), ("Tripura", 23.83, 91.28),
+    ("Uttar Pradesh", 27.0, 80.9), ("Uttar Pradesh", 26.85, 80.95), ("Uttar Pradesh", 25.32, 82.97),
+    ("Uttar Pradesh", 27.18, 78.01), ("Uttar Pradesh", 28.67, 77.45), ("Uttar Pradesh", 28.54, 77.39),
+    ("Uttar Pradesh", 28.98, 77.71), ("Uttar Pradesh", 26.45, 80.33), ("Uttar Pradesh", 25.44, 81.85),
+    ("Uttar Pradesh", 26.76, 83.37), ("Uttar Pradesh", 28.37, 79.43), ("Uttar Pradesh", 25.45, 78.57),
+    ("Uttarakhand", 30.1, 79.0), ("Uttarakhand", 30.32, 78.03), ("Uttarakhand", 29.22, 79.51),
+    ("West Bengal", 23.0, 87.8), ("West Bengal", 22.57, 88.36), ("West Bengal", 26.73, 88.4),
+    ("West Bengal", 25.0, 88.14), ("West Bengal", 23.52, 87.31), ("West Bengal", 27.06, 88.47),
+    ("Andaman and Nicobar Islands", 11.67, 92.74), ("Andaman and Nicobar Islands", 8.0, 93.5),
+    ("Chandigarh", 30.73, 76.78),
+    ("Dadra and Nagar Haveli and Daman and Diu", 20.27, 73.02),
+    ("Dadra and Nagar Haveli and Daman and Diu", 20.4, 72.83),
+    ("Delhi", 28.65, 77.2), ("Delhi", 28.7, 77.1), ("Delhi", 28.55, 77.2),
+    ("Jammu and Kashmir", 33.7, 75.1), ("Jammu and Kashmir", 34.08, 74.8), ("Jammu and Kashmir", 32.73, 74.86),
+    ("Ladakh", 34.2, 77.6), ("Ladakh", 34.56, 76.13),
+    ("Lakshadweep", 10.57, 72.64),
+    ("Puducherry", 11.93, 79.83),
+]
+
+
+class RegionLookup:
+    """
+    Assigns coordinates to the region of the nearest reference point.
+    """
+
+    def __init__(self, points=REGION_POINTS):
+        self.names = np.array([p[0] for p in points], dtype=object)
+        self.lats = np.array([p[1] for p in points], dtype=float)
+        self.lons = np.array([p[2] for p in points], dtype=float)
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Reads reference points from a CSV with region, lat and lon columns.
+        """
+        import pandas as pd
+
+        df = pd.read_csv(path, usecols=['region', 'lat', 'lon'])
+        return cls(list(df.itertuples(index=False, name=None)))
+
+    def lookup(self, lats, lons):
+        """
+        Region names for arrays of coordinates. Uses an equirectangular distance, which ranks
+        neighbours the same as great-circle distance at these scales.
+        """
+        lats = np.asarray(lats, dtype=float)[:, None]
+        lons = np.asarray(lons, dtype=float)[:, None]
+        scale = np.cos(np.radians(lats))
+        d2 = (lats - self.lats) ** 2 + ((lons - self.lons) * scale) ** 2
+        return self.names[np.argmin(d2, axis=1)]
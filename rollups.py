@@ -0,0 +1,114 @@
+import warnings
+import numpy as np
+import pandas as pd
+from aqi_api import POLLUTANTS
+from utils import sub_index
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# The unix epoch is a Thursday; shift so weekly buckets start on Monday 00:00 UTC
+_WEEK_OFFSET = 4 * DAY
+
+# Calendar buckets kept per location (bucket start, UTC)
+PERIODS = {"day": DAY, "week": WEEK}
+# Trailing 24h windows ending at the latest stored hour and the 24h before it
+TRAILING = "24h"
+
+# Rolled-up series: every pollutant plus the overall CPCB AQI
+ROLLUP_COLUMNS = POLLUTANTS + ["aqi"]
+STATS = ["mean", "max", "p95", "exceed_hours", "hours"]
+
+
+def bucket_start(ts, period):
+    """
+    Start of the `period` bucket (unix seconds) containing each timestamp in `ts`.
+    """
+    seconds = PERIODS[period]
+    offset = _WEEK_OFFSET if period == "week" else 0
+    return (np.asarray(ts, dtype=np.int64) - offset) // seconds * seconds + offset
+
+
+def with_aqi(values):
+    """
+    Returns (series, exceed): a float array of the rolled-up columns (pollutants, then the
+    overall AQI) and a matching boolean array of exceedance hours.
+    An hour exceeds when its sub-index is above 100, i.e. beyond the CPCB "Satisfactory" band
+    (the national ambient standard); for `aqi` when the overall AQI is above 100.
+    """
+    data = values.reindex(columns=POLLUTANTS).to_numpy(dtype=float)
+    sub = np.column_stack([sub_index(data[:, i], p) for i, p in enumerate(POLLUTANTS)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        aqi = np.nanmax(sub, axis=1)
+    series = np.column_stack([data, aqi])
+    exceed = np.column_stack([sub, aqi]) > 100
+    return series, exceed
+
+
+def aggregate(values, keys):
+    """
+    Rolls hourly readings up per key. Returns rows of (key, column, mean, max, p95, exceed_hours, hours).
+    `values` is a frame of pollutant columns sorted by time; `keys` a sorted array of bucket ids
+    aligned with it. Buckets hold at most a week of hours, so plain NumPy per bucket beats a pandas groupby.
+    """
+    if values.empty:
+        return []
+    series, exceed = with_aqi(values)
+    bucket_keys, starts = np.unique(keys, return_index=True)
+    bounds = list(starts[1:]) + [len(keys)]
+
+    rows = []
+    with warnings.catch_warnings():
+        # All-NaN columns in a bucket are expected; they are skipped below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for key, lo, hi in zip(bucket_keys, starts, bounds):
+            chunk = series[lo:hi]
+            hours = np.count_nonzero(~np.isnan(chunk), axis=0)
+            # nanpercentile falls back to a slow per-column loop; gaps are the exception
+            percentile = np.percentile if hours.min() == len(chunk) else np.nanpercentile
+            stats = (
+                np.nanmean(chunk, axis=0),
+                np.nanmax(chunk, axis=0),
+                percentile(chunk, 95, axis=0),
+                exceed[lo:hi].sum(axis=0),
+            )
+            for i, column in enumerate(ROLLUP_COLUMNS):
+                if hours[i]:
+                    rows.append((int(key), column, *(float(stat[i]) for stat in stats), int(hours[i])))
+    return rows
+
+
+def compute_rollups(history, since):
+    """
+    Recomputes every rollup touched by readings at or after `since` (unix seconds).
+    `history` holds the raw readings indexed by unix seconds, reaching back at least to the
+    start of the week containing `since` and 48h before the latest reading.
+    Returns rows of (period, bucket, column, mean, max, p95, exceed_hours, hours).
+    """
+    if history.empty:
+        return []
+    ts = history.index.to_numpy(dtype=np.int64)
+    rows = []
+    for period in PERIODS:
+        keys = bucket_start(ts, period)
+        touched = keys >= bucket_start([since], period)[0]
+        rows += [(period, *row) for row in aggregate(history[touched], keys[touched])]
+
+    # Trailing windows are keyed by their (exclusive) end: the hour after the latest reading
+    end = (int(ts.max()) // HOUR + 1) * HOUR
+    for window_end in (end, end - DAY):
+        in_window = (ts >= window_end - DAY) & (ts < window_end)
+        keys = np.full(int(in_window.sum()), window_end)
+        rows += [(TRAILING, *row) for row in aggregate(history[in_window], keys)]
+    return rows
+
+
+def rollup_table(rows):
+    """
+    Turns stored rollup rows (bucket, column, stats...) into a frame indexed by bucket time
+    with one `column` / stat row per rolled-up series.
+    """
+    df = pd.DataFrame(rows, columns=["bucket", "column"] + STATS)
+    df["bucket"] = pd.to_datetime(df["bucket"], unit="s")
+    return df.set_index("bucket")
@@ -0,0 +1,303 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from grid import plan_grid_cells, unique_cells, DEFAULT_CELL_SIZE
+from aqi_api import POLLUTANTS
+from batch_writer import record_key, to_output_frame
+from rate_limiter import TokenBucket, DEFAULT_CALLS_PER_MINUTE
+import metrics
+
+# Half the free-tier quota by default, leaving the rest for dashboard fetches
+DEFAULT_BUDGET = DEFAULT_CALLS_PER_MINUTE // 2
+# Seconds between snapshot rewrites
+DEFAULT_FLUSH_INTERVAL = 60
+# Staleness assumed for cells the store has never refreshed
+UNSEEN_HOURS = 24.0
+# Worse air is refreshed sooner; cells without a reading rank like Poor ones
+CATEGORY_WEIGHTS = {"Good": 0.5, "Satisfactory": 0.75, "Moderate": 1.0, "Poor": 1.5,
+                    "Very Poor": 2.0, "Severe": 3.0, "Unknown": 1.5}
+# An hourly AQI change of this many points doubles a cell's priority (capped at 4x)
+CHANGE_SCALE = 25.0
+
+SNAPSHOT_FIELDS = ["city", "lat", "lon", "timestamp"] + POLLUTANTS
+
+
+class RefreshScheduler:
+    """
+    Keeps the snapshot fresh by refreshing grid cells in priority order within an API budget.
+    A cell's priority grows with the hours since it was last refreshed and is scaled by its last
+    AQI category, how fast its AQI is changing and how often the dashboard views its cities.
+    Priorities change with the clock, so they are recomputed for all cells at every pick
+    (a few microseconds per thousand cells) instead of being kept in a heap.
+    Cells already refreshed this hour are skipped: the provider publishes hourly, so the
+    scheduler never calls the API more often than a full batch run would.
+    """
+
+    def __init__(self, cities_df, budget=DEFAULT_BUDGET, workers=4, grid_size=DEFAULT_CELL_SIZE,
+                 store=None, snapshot_path=None, history_array=False):
+        import numpy as np
+        from history_store import get_default_store, location_key
+        from snapshot import SNAPSHOT_CSV
+
+        self.store = store if store is not None else get_default_store()
+        self.snapshot_path = snapshot_path or SNAPSHOT_CSV
+        self.workers = max(1, workers)
+        self.history_array = history_array
+        self.limiter = TokenBucket(budget)
+
+        planned = plan_grid_cells(cities_df, grid_size)
+        self.cells = unique_cells(planned)
+        index = {cell: i for i, cell in enumerate(self.cells)}
+        planned['cell'] = [index[c] for c in planned[['cell_lat', 'cell_lon']].itertuples(index=False, name=None)]
+        self.cell_cities = {i: group for i, group in planned.groupby('cell', sort=False)[['city', 'lat', 'lon']]}
+        self._city_cell = {location_key(lat, lon): cell for lat, lon, cell
+                           in planned[['lat', 'lon', 'cell']].itertuples(index=False, name=None)}
+
+        n = len(self.cells)
+        self.refreshed = np.full(n, np.nan)
+        self.aqi = np.full(n, np.nan)
+        self.change = np.zeros(n)
+        self.demand = np.zeros(n)
+        for i, (lat, lon) in enumerate(self.cells):
+            _, checked = self.store.get_watermark(lat, lon)
+            if checked:
+                self.refreshed[i] = checked
+        self.records = {}
+        self._load_snapshot()
+        self.update_demand()
+
+    def _load_snapshot(self):
+        """
+        Starts from the current snapshot, so rewrites keep cities not refreshed yet.
+        """
+        import pandas as pd
+
+        if not os.path.exists(self.snapshot_path):
+            return
+        df = pd.read_csv(self.snapshot_path)
+        for row in df.reindex(columns=SNAPSHOT_FIELDS).to_dict("records"):
+            self.records[record_key(row['city'], row['lat'], row['lon'])] = row
+        if 'aqi' in df.columns:
+            by_city = dict(zip(
+                (record_key(*r) for r in df[['city', 'lat', 'lon']].itertuples(index=False, name=None)), df['aqi']
+            ))
+            for i, group in self.cell_cities.items():
+                values = [by_city.get(record_key(*r)) for r in group.itertuples(index=False, name=None)]
+                values = [v for v in values if v is not None and not math.isnan(v)]
+                if values:
+                    self.aqi[i] = max(values)
+
+    def update_demand(self):
+        """
+        Sums the dashboard's recent views of each cell's cities.
+        """
+        self.demand[:] = 0.0
+        for loc, views in self.store.demand().items():
+            cell = self._city_cell.get(loc)
+            if cell is not None:
+                self.demand[cell] += views
+
+    def priorities(self, now=None):
+        """
+        Current priority of every cell; cells refreshed during this hour get -inf.
+        """
+        import numpy as np
+        from utils import categorize_aqi
+
+        now = time.time() if now is None else now
+        hours = np.where(np.isnan(self.refreshed), UNSEEN_HOURS, (now - self.refreshed) / 3600.0)
+        categories = categorize_aqi(self.aqi)
+        weight = np.array([CATEGORY_WEIGHTS.get(c, 1.0) for c in categories])
+        change = 1.0 + np.minimum(self.change / CHANGE_SCALE, 3.0)
+        score = hours * weight * change * (1.0 + np.log1p(self.demand))
+        due = np.isnan(self.refreshed) | (self.refreshed // 3600 < now // 3600)
+        return np.where(due, score, -np.inf)
+
+    def next_cell(self, busy=(), now=None):
+        """
+        Index of the highest-priority cell that is due and not already being refreshed, or None.
+        """
+        import numpy as np
+
+        score = self.priorities(now)
+        if busy:
+            score[list(busy)] = -np.inf
+        best = int(np.argmax(score))
+        return best if np.isfinite(score[best]) else None
+
+    @metrics.timed("scheduler_refresh_seconds")
+    def refresh_cell(self, i):
+        """
+        Fetches a cell's recent history; only hours newer than the store's watermark hit the API.
+        """
+        from history_store import fetch_history
+
+        lat, lon = self.cells[i]
+        return fetch_history(lat, lon, past_days=1, limiter=self.limiter, store=self.store)
+
+    def record(self, i, df):
+        """
+        Applies a cell's fetched history to its priority inputs and to its cities' snapshot rows.
+        """
+        from utils import add_aqi_columns
+
+        self.refreshed[i] = time.time()
+        metrics.inc("scheduler_refreshes_total")
+        if df.empty:
+            metrics.inc("cells_without_data_total")
+            return
+        aqi = add_aqi_columns(df.tail(2))['aqi'].to_numpy(dtype=float)
+        self.aqi[i] = aqi[-1]
+        self.change[i] = abs(aqi[-1] - aqi[0]) if len(aqi) == 2 and not math.isnan(aqi[0]) else 0.0
+
+        latest = df.iloc[-1]
+        reading = {'timestamp': latest.name, **latest.reindex(POLLUTANTS).to_dict()}
+        for city, lat, lon in self.cell_cities[i].itertuples(index=False, name=None):
+            self.records[record_key(city, lat, lon)] = {'city': city, 'lat': lat, 'lon': lon, **reading}
+
+    def batch_running(self):
+        """
+        True while an app.py batch run holds a checkpoint for the snapshot.
+        """
+        return os.path.exists(f"{self.snapshot_path}.checkpoint")
+
+    def write_snapshot(self, parquet=False):
+        """
+        Rewrites the snapshot under a temporary name and swaps it in, so the read API and the
+        dashboard never see a partial file. Returns False, leaving the snapshot alone, while a
+        batch run is in progress.
+        """
+        import pandas as pd
+        from snapshot import csv_to_parquet, SNAPSHOT_PARQUET
+
+        if self.batch_running():
+            metrics.inc("scheduler_snapshot_skips_total")
+            return False
+        out = to_output_frame(pd.DataFrame(list(self.records.values()), columns=SNAPSHOT_FIELDS))
+        tmp_path = self.snapshot_path + ".tmp"
+        out.to_csv(tmp_path, index=False)
+        # A batch run may have started while the frame was written
+        if self.batch_running():
+            os.remove(tmp_path)
+            metrics.inc("scheduler_snapshot_skips_total")
+            return False
+        os.replace(tmp_path, self.snapshot_path)
+        if parquet:
+            csv_to_parquet(self.snapshot_path, SNAPSHOT_PARQUET)
+        metrics.inc("scheduler_snapshot_writes_total")
+        if self.history_array:
+            from history_array import sync
+            sync(store=self.store)
+        return True
+
+    def run(self, flush_interval=DEFAULT_FLUSH_INTERVAL, duration=None, parquet=False, report=print):
+        """
+        Refreshes cells until interrupted (or for `duration` seconds), rewriting the snapshot
+        every `flush_interval` seconds when something changed.
+        """
+        started = last_flush = time.monotonic()
+        refreshed = 0
+        inflight = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aqi-scheduler") as pool:
+            try:
+                while duration is None or time.monotonic() - started < duration:
+                    # Workers block on the budget, so a pick waits at most a few tokens' time
+                    while len(inflight) < self.workers:
+                        i = self.next_cell(busy=inflight.values())
+                        if i is None:
+                            break
+                        inflight[pool.submit(self.refresh_cell, i)] = i
+
+                    done, _ = wait(inflight, timeout=1.0, return_when=FIRST_COMPLETED) if inflight else (set(), None)
+                    if not inflight:
+                        time.sleep(1.0)
+                    for future in done:
+                        i = inflight.pop(future)
+                        try:
+                            self.record(i, future.result())
+                            refreshed += 1
+                        except Exception as e:
+                            # Counted as refreshed so one failing cell does not starve the rest
+                            self.refreshed[i] = time.time()
+                            metrics.inc("scheduler_failures_total")
+                            report(f"Refresh of cell {self.cells[i][0]:.2f}, {self.cells[i][1]:.2f} failed: {e}")
+
+                    if time.monotonic() - last_flush >= flush_interval:
+                        if refreshed:
+                            if self.write_snapshot(parquet):
+                                report(self.status(refreshed, time.monotonic() - last_flush))
+                                refreshed = 0
+                            else:
+                                report("A batch run (app.py) is writing the snapshot; rewrite postponed.")
+                        last_flush = time.monotonic()
+                        self.update_demand()
+            finally:
+                for future in inflight:
+                    future.cancel()
+                if refreshed:
+                    if self.write_snapshot(parquet):
+                        report(self.status(refreshed, time.monotonic() - last_flush))
+                    else:
+                        report("A batch run (app.py) is writing the snapshot; last refreshes not written.")
+
+    def status(self, refreshed, elapsed):
+        import numpy as np
+
+        due = int(np.isfinite(self.priorities()).sum())
+        return (f"{time.strftime('%H:%M:%S')} refreshed {refreshed} cells in {elapsed:.0f}s; "
+                f"{due} of {len(self.cells)} cells due this hour")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Continuously refresh the AQI snapshot, most important cities first, within an API budget.")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET,
+                        help=f"API calls to spend per minute (default: {DEFAULT_BUDGET})")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Concurrent API requests (default: 4)")
+    parser.add_argument("--grid-size", type=float, default=DEFAULT_CELL_SIZE,
+                        help=f"Grid cell size in degrees, as for app.py (default: {DEFAULT_CELL_SIZE})")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help=f"Seconds between snapshot rewrites (default: {DEFAULT_FLUSH_INTERVAL})")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after this many seconds (default: run until interrupted)")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also rewrite the Parquet snapshot (needs pyarrow)")
+    parser.add_argument("--history-array", action="store_true",
+                        help="Also update the memory-mapped history array on every snapshot rewrite")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve live metrics on this port (/metrics for Prometheus, /metrics.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from city_loader import load_cities
+    from snapshot import SNAPSHOT_CSV
+
+    cities_df = load_cities()
+    if cities_df.empty:
+        print("No cities found. Exiting.")
+        return
+    if os.path.exists(f"{SNAPSHOT_CSV}.checkpoint"):
+        print("A batch run (app.py) is writing the snapshot; finish or resume it before starting the scheduler.")
+        return
+
+    scheduler = RefreshScheduler(cities_df, budget=args.budget, workers=args.workers, grid_size=args.grid_size,
+                                 history_array=args.history_array)
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    print(f"Scheduling {len(cities_df)} cities in {len(scheduler.cells)} grid cells "
+          f"at up to {args.budget} API calls/min. Press Ctrl-C to stop.")
+    try:
+        scheduler.run(args.flush_interval, args.duration, args.parquet)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+
+if __name__ == "__main__":
+    main()
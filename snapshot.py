@@ -0,0 +1,148 @@
+import os
+import pandas as pd
+from aqi_api import POLLUTANTS
+from utils import AQI_CATEGORIES
+
+SNAPSHOT_CSV = "India_All_Cities_AQI.csv"
+SNAPSHOT_PARQUET = "India_All_Cities_AQI.parquet"
+
+CATEGORY_DTYPE = pd.CategoricalDtype(AQI_CATEGORIES + ["Unknown"])
+FLOAT_COLUMNS = POLLUTANTS + ["aqi"]
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet snapshots need pyarrow: pip install pyarrow") from e
+    return pq
+
+
+def to_compact(df):
+    """
+    Casts a snapshot frame to compact dtypes: categorical city/category, float32 pollutants.
+    """
+    out = df.copy()
+    if 'city' in out.columns:
+        out['city'] = out['city'].astype('category')
+    if 'aqi_category' in out.columns:
+        out['aqi_category'] = out['aqi_category'].astype(CATEGORY_DTYPE)
+    for col in FLOAT_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype('float32')
+    if 'timestamp' in out.columns:
+        out['timestamp'] = pd.to_datetime(out['timestamp'])
+    return out
+
+
+def csv_to_parquet(csv_path=SNAPSHOT_CSV, parquet_path=SNAPSHOT_PARQUET, chunksize=10000):
+    """
+    Converts a CSV snapshot to Parquet chunk by chunk. Each chunk is split into one row group
+    per AQI category, so category filters can skip whole row groups via their statistics.
+    """
+    pq = _require_pyarrow()
+    import pyarrow as pa
+
+    tmp_path = parquet_path + ".tmp"
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = to_compact(chunk)
+            # Plain strings on disk; Parquet dictionary-encodes them and the loader restores categoricals
+            chunk['city'] = chunk['city'].astype(str)
+            if 'aqi_category' in chunk.columns:
+                chunk['aqi_category'] = chunk['aqi_category'].astype(str)
+                groups = [g for _, g in chunk.groupby('aqi_category', sort=True)]
+            else:
+                groups = [chunk]
+            for group in groups:
+                table = pa.Table.from_pandas(group, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+                writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return None
+    # Swap in atomically so readers never see a half-written file
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
+def latest_snapshot_path(csv_path=SNAPSHOT_CSV, parquet_path=SNAPSHOT_PARQUET):
+    """
+    The snapshot written last: Parquet if it is at least as new as the CSV, else the CSV.
+    Runs without --parquet only rewrite the CSV, so an older Parquet file must not shadow it.
+    """
+    if not os.path.exists(parquet_path):
+        return csv_path
+    if os.path.exists(csv_path) and os.stat(csv_path).st_mtime_ns > os.stat(parquet_path).st_mtime_ns:
+        return csv_path
+    return parquet_path
+
+
+def _row_group_may_match(pf, group, categories):
+    """
+    Uses the row group's min/max statistics on aqi_category to decide whether it can be skipped.
+    """
+    rg = pf.metadata.row_group(group)
+    for i in range(rg.num_columns):
+        col = rg.column(i)
+        if col.path_in_schema != 'aqi_category':
+            continue
+        stats = col.statistics
+        if stats is None or not stats.has_min_max:
+            return True
+        return any(stats.min <= c <= stats.max for c in categories)
+    return True
+
+
+def _pa_array(values):
+    import pyarrow as pa
+    return pa.array(list(values), type=pa.string())
+
+
+def load_snapshot(path=None, columns=None, categories=None):
+    """
+    Loads a snapshot with compact dtypes.
+    `columns` projects to a subset of columns; `categories` keeps only those AQI categories.
+    Parquet files are read column-by-column with row-group filtering; CSV is the fallback.
+    With no path, the newer of the Parquet and CSV snapshots is used.
+    """
+    if path is None:
+        path = latest_snapshot_path()
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns or [])
+
+    if path.endswith(".parquet"):
+        pq = _require_pyarrow()
+        import pyarrow.compute as pc
+
+        pf = pq.ParquetFile(path)
+        read_columns = list(columns) if columns else None
+        if read_columns and categories and 'aqi_category' not in read_columns:
+            read_columns.append('aqi_category')
+        groups = range(pf.metadata.num_row_groups)
+        if categories:
+            groups = [g for g in groups if _row_group_may_match(pf, g, categories)]
+        table = pf.read_row_groups(list(groups), columns=read_columns)
+        if categories:
+            table = table.filter(pc.is_in(table['aqi_category'], value_set=_pa_array(categories)))
+        df = to_compact(table.to_pandas())
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in (columns or header) if c in header]
+        if categories and 'aqi_category' not in usecols:
+            usecols.append('aqi_category')
+        dtypes = {c: 'float32' for c in FLOAT_COLUMNS if c in usecols}
+        df = pd.read_csv(path, usecols=usecols, dtype=dtypes)
+        if categories:
+            df = df[df['aqi_category'].isin(categories)].reset_index(drop=True)
+        df = to_compact(df)
+
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import metrics
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_breakers = {}
+
+
+class TransportError(Exception):
+    """
+    Raised when a request fails after retries, or is refused by the circuit breaker.
+    """
+
+
+class CircuitOpenError(TransportError):
+    pass
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent traffic so a struggling provider is not flooded with retries.
+    Every request deposits `ratio` tokens (up to `max_tokens`), every retry spends one.
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds, then lets a single trial call through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            # Only the first caller after the timeout gets the trial; others wait for its outcome
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+retry_budget = RetryBudget()
+
+
+def get_session():
+    """
+    Returns the process-wide pooled keep-alive session.
+    """
+    global _session
+    if _session is None:
+        # requests is imported on first use to keep module import cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=64)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Accept-Encoding": "gzip, deflate"})
+                _session = session
+    return _session
+
+
+def get_breaker(url):
+    host = urlparse(url).netloc
+    with _session_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def _retry_delay(response, attempt, backoff, max_backoff):
+    """
+    Honours Retry-After (seconds or HTTP date) when present, else exponential backoff with jitter.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(max_backoff, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(max_backoff, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return min(max_backoff, backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+def request(method, url, max_retries=3, backoff=0.5, max_backoff=30.0, limiter=None, **kwargs):
+    """
+    Sends a request through the pooled session with retries, the shared retry budget
+    and the per-host circuit breaker. Returns the final Response (which may still be an
+    error status); raises TransportError if no response could be obtained.
+    """
+    from requests import RequestException
+
+    kwargs.setdefault("timeout", 10)
+    session = get_session()
+    breaker = get_breaker(url)
+    retry_budget.record_request()
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            metrics.inc("http_circuit_open_total")
+            raise CircuitOpenError(f"circuit open for {urlparse(url).netloc}")
+        if limiter is not None:
+            with metrics.timer("rate_limit_wait_seconds"):
+                limiter.acquire()
+
+        response, error = None, None
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except RequestException as e:
+            error = e
+        metrics.observe("http_request_seconds", time.perf_counter() - start)
+        metrics.inc("http_responses_total", status=response.status_code if response is not None else "error")
+
+        failed = error is not None or response.status_code in RETRY_STATUSES
+        # 429 means we are too fast, not that the provider is down
+        if failed and (response is None or response.status_code != 429):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if not failed:
+            return response
+        if attempt >= max_retries or not retry_budget.try_spend():
+            if response is not None:
+                return response
+            raise TransportError(f"{method} {url} failed: {error}") from error
+
+        metrics.inc("http_retries_total")
+        time.sleep(_retry_delay(response, attempt, backoff, max_backoff))
+        attempt += 1
@@ -1,4 +1,36 @@
 import math
+import numpy as np
+import pandas as pd
+
+# --- CPCB National AQI ---
+# Sub-index breakpoints: concentration at each AQI band edge (0, 50, 100, 200, 300, 400, 500).
+# All concentrations are µg/m³ (as returned by the API) except CO, which CPCB defines in mg/m³.
+# The last breakpoint caps the Severe band at AQI 500.
+AQI_BREAKPOINTS = np.array([0, 50, 100, 200, 300, 400, 500], dtype=float)
+CPCB_BREAKPOINTS = {
+    "pm2_5": np.array([0, 30, 60, 90, 120, 250, 500], dtype=float),
+    "pm10": np.array([0, 50, 100, 250, 350, 430, 600], dtype=float),
+    "no2": np.array([0, 40, 80, 180, 280, 400, 800], dtype=float),
+    "o3": np.array([0, 50, 100, 168, 208, 748, 1000], dtype=float),
+    "so2": np.array([0, 40, 80, 380, 800, 1600, 2000], dtype=float),
+    "co": np.array([0, 1, 2, 10, 17, 34, 50], dtype=float),
+}
+# Multiply API values by this to get CPCB units
+UNIT_SCALE = {"co": 0.001}
+
+AQI_CATEGORIES = ["Good", "Satisfactory", "Moderate", "Poor", "Very Poor", "Severe"]
+# Upper AQI bound of every category but Severe
+_CATEGORY_UPPER = np.array([50, 100, 200, 300, 400], dtype=float)
+
+HEALTH_RECOMMENDATIONS = {
+    "Good": "Air quality is good. Enjoy your outdoor activities!",
+    "Satisfactory": "Air quality is acceptable. Sensitive groups should consider reducing heavy exertion.",
+    "Moderate": "Members of sensitive groups may experience health effects. The general public is not likely to be affected.",
+    "Poor": "Everyone may begin to experience health effects; members of sensitive groups may experience more serious health effects.",
+    "Very Poor": "Health warnings of emergency conditions. The entire population is more likely to be affected.",
+    "Severe": "Health alert: everyone may experience more serious health effects. Avoid all outdoor exertion.",
+    "Unknown": "No data available.",
+}
 
 def safe_value(x, default=0.0):
     """
@@ -14,19 +46,83 @@ def safe_value(x, default=0.0):
     except (ValueError, TypeError):
         return default
 
+def sub_index(values, pollutant):
+    """
+    Vectorized CPCB sub-index for one pollutant. Accepts a scalar, array or Series of
+    concentrations in API units and returns a float array; missing or negative values give NaN.
+    CPCB averages (24h, 8h for O3/CO) are left to the caller; hourly values are indexed as-is.
+    """
+    conc = np.asarray(values, dtype=float)
+    flat = np.atleast_1d(conc) * UNIT_SCALE.get(pollutant, 1.0)
+    result = np.interp(flat, CPCB_BREAKPOINTS[pollutant], AQI_BREAKPOINTS)
+    result[~(flat >= 0)] = np.nan
+    return result.reshape(conc.shape)
+
+def compute_sub_indices(df):
+    """
+    Returns a DataFrame with one sub-index column per pollutant present in `df`
+    (same index, NaN where the pollutant is missing).
+    """
+    return pd.DataFrame(
+        {p: sub_index(df[p].to_numpy(), p) for p in CPCB_BREAKPOINTS if p in df.columns},
+        index=df.index,
+    )
+
+def categorize_aqi(aqi):
+    """
+    Vectorized AQI -> category. Returns an object array; NaN maps to "Unknown".
+    """
+    aqi = np.asarray(aqi, dtype=float)
+    flat = np.atleast_1d(aqi)
+    labels = np.array(AQI_CATEGORIES + ["Unknown"], dtype=object)
+    codes = np.searchsorted(_CATEGORY_UPPER, flat, side="left")
+    codes[~(flat >= 0)] = len(AQI_CATEGORIES)
+    return labels[codes].reshape(aqi.shape)
+
+def add_aqi_columns(df):
+    """
+    Computes overall CPCB AQI for a whole frame in one pass.
+    Adds `aqi` (max of the pollutant sub-indices), `aqi_category` and `dominant_pollutant`.
+    Works on a single city's history or a multi-city snapshot alike.
+    """
+    sub = compute_sub_indices(df)
+    out = df.copy()
+    if sub.empty:
+        out["aqi"] = np.nan
+        out["aqi_category"] = "Unknown"
+        out["dominant_pollutant"] = None
+        return out
+
+    values = sub.to_numpy()
+    valid = ~np.isnan(values).all(axis=1)
+    aqi = np.full(len(sub), np.nan)
+    aqi[valid] = np.nanmax(values[valid], axis=1)
+    dominant = np.full(len(sub), None, dtype=object)
+    dominant[valid] = sub.columns.to_numpy()[np.nanargmax(values[valid], axis=1)]
+
+    out["aqi"] = np.round(aqi)
+    out["aqi_category"] = categorize_aqi(out["aqi"])
+    out["dominant_pollutant"] = dominant
+    return out
+
+def health_recommendations(categories):
+    """
+    Vectorized category -> health recommendation.
+    """
+    return pd.Series(categories).map(HEALTH_RECOMMENDATIONS).fillna(HEALTH_RECOMMENDATIONS["Unknown"]).to_numpy()
+
 def get_aqi_category(pm25):
     """
     Determines the AQI category based on PM2.5 concentration.
     """
     val = safe_value(pm25, default=-1)
-    
-    if val < 0: return "Unknown"
-    if val <= 30: return "Good"
-    if val <= 60: return "Satisfactory"
-    if val <= 90: return "Moderate"
-    if val <= 120: return "Poor"
-    if val <= 250: return "Very Poor"
-    return "Severe"
+    return categorize_aqi(sub_index(val, "pm2_5"))[()]
+
+def get_aqi_category_from_aqi(aqi):
+    """
+    Determines the AQI category from an overall AQI value.
+    """
+    return categorize_aqi(safe_value(aqi, default=-1))[()]
 
 def get_aqi_color(category):
     """
@@ -47,12 +143,10 @@ def health_recommendation(pm25):
     """
     Returns health recommendation based on PM2.5.
     """
-    val = safe_value(pm25, default=-1)
-    if val < 0: return "No data available."
-    
-    if val <= 30: return "Air quality is good. Enjoy your outdoor activities!"
-    if val <= 60: return "Air quality is acceptable. Sensitive groups should consider reducing heavy exertion."
-    if val <= 90: return "Members of sensitive groups may experience health effects. The general public is not likely to be affected."
-    if val <= 120: return "Everyone may begin to experience health effects; members of sensitive groups may experience more serious health effects."
-    if val <= 250: return "Health warnings of emergency conditions. The entire population is more likely to be affected."
-    return "Health alert: everyone may experience more serious health effects. Avoid all outdoor exertion."
+    return category_recommendation(get_aqi_category(pm25))
+
+def category_recommendation(category):
+    """
+    Returns health recommendation for an AQI category.
+    """
+    return HEALTH_RECOMMENDATIONS.get(category, HEALTH_RECOMMENDATIONS["Unknown"])